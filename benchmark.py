@@ -0,0 +1,196 @@
+"""
+Reproducible benchmarks of the simulator hot paths. Every scenario uses fixed seeds and runs in a fresh worker process,
+so peak RSS is measured per scenario. Results are saved as JSON to compare commits (see compare).
+"""
+from runner import Simulator
+from elevator import Otis
+from passenger import Passenger
+from logger import NullSink
+from telemetry import Telemetry
+from config import BuildingConfig
+from concurrent.futures import ProcessPoolExecutor
+import argparse, json, platform, resource, statistics, subprocess, sys, time, tracemalloc
+
+def scenario(name, kind = "run", **params):
+    return dict(params, name = name, kind = kind)
+
+#Scenarios: scaling in requests, elevators and floors, zoned banks, bursts of identical requests (like test_case_8/9) and the separate hot paths
+SCENARIOS = [
+    scenario("requests_1k", request_length = 1000),
+    scenario("requests_4k", request_length = 4000),
+    scenario("requests_16k", request_length = 16000),
+    scenario("elevators_6", request_length = 4000, elevator_num = 6),
+    scenario("elevators_12", request_length = 4000, elevator_num = 12),
+    scenario("floors_20", request_length = 4000, num_floors = 20),
+    scenario("floors_400", request_length = 4000, num_floors = 400),
+    scenario("up_peak_4k", request_length = 4000, traffic_profile = "up_peak", arrival_rate = None),
+    scenario("legacy_generator_1k", request_length = 1000, traffic_profile = None),
+    scenario("tick_engine_1k", request_length = 1000, engine = "tick"),
+    scenario("eta_dispatch_4k", request_length = 4000, dispatcher = "eta"),
+    scenario("destination_dispatch_4k", request_length = 4000, dispatcher = "destination"),
+    scenario("elevators_100", request_length = 8000, elevator_num = 100, num_floors = 200, traffic_profile = "up_peak", arrival_rate = 100/60),
+    scenario("zoned_100", request_length = 8000, elevator_num = 100, num_floors = 200, zones = 5, traffic_profile = "up_peak", arrival_rate = 100/60),
+    scenario("zoned_100_eta", request_length = 8000, elevator_num = 100, num_floors = 200, zones = 5, traffic_profile = "up_peak", arrival_rate = 100/60,
+        dispatcher = "eta"),
+    scenario("burst_case_8", kind = "burst", bursts = [(2, 10, 10, 5, 1200)]),
+    scenario("burst_case_9", kind = "burst", bursts = [(2, 10, 1, 5, 1200), (8, 11, 3, 5, 1200), (9, 12, 5, 5, 300)]),
+    scenario("process_request_heap", kind = "dispatch", request_length = 5000, dispatcher = "heap", elevator_num = 12),
+    scenario("process_request_eta", kind = "dispatch", request_length = 5000, dispatcher = "eta", elevator_num = 12),
+    scenario("otis_update", kind = "update", request_length = 300, ticks = 50000),
+]
+
+#Defaults of run scenarios
+RUN_DEFAULTS = {"request_length": 1000, "elevator_num": 3, "num_floors": 50, "traffic_profile": "poisson", "arrival_rate": 0.5,
+    "engine": "event", "dispatcher": "heap", "seed": 1, "zones": 0}
+
+def make_config(params):
+    #Single bank building, or zones banks of elevator_num/zones cars each (see BuildingConfig.zoned)
+    if params["zones"]:
+        return BuildingConfig.zoned(params["num_floors"], params["zones"], params["elevator_num"]//params["zones"])
+    return BuildingConfig(num_floors = params["num_floors"])
+
+def make_simulator(params, **kwargs):
+    params = dict(RUN_DEFAULTS, **params)
+    return Simulator(request_length = params["request_length"], random_seed = params["seed"], engine = params["engine"], log_sink = NullSink(),
+        telemetry = Telemetry(mode = "changes"), request_table = True, traffic_profile = params["traffic_profile"], arrival_rate = params["arrival_rate"],
+        elevator_num = params["elevator_num"], config = make_config(params), dispatcher = params["dispatcher"], **kwargs)
+
+def bench_run(params):
+    #Full Simulator.run followed by fetch_summary_stats, timed separately
+    simulator = make_simulator(params)
+    start = time.perf_counter()
+    simulator.run("simulate")
+    run_time = time.perf_counter() - start
+    start = time.perf_counter()
+    simulator.fetch_summary_stats()
+    stats_time = time.perf_counter() - start
+    return {"wall_time": run_time + stats_time, "run_time": run_time, "stats_time": stats_time,
+        "simulated_time": simulator.test_otis.current_time, "requests": int(simulator.summary_df["Total Queries"].iloc[0])}
+
+def bench_burst(params):
+    #Simulator.run on many identical requests arriving at the same time. bursts: (pick-up, drop-off, time, num_passengers, count)
+    data = [(pick_up, drop_off, at, num) for pick_up, drop_off, at, num, count in params["bursts"] for _ in range(count)]
+    simulator = make_simulator(params, test_data = data)
+    start = time.perf_counter()
+    simulator.run("test")
+    run_time = time.perf_counter() - start
+    start = time.perf_counter()
+    simulator.fetch_summary_stats()
+    stats_time = time.perf_counter() - start
+    return {"wall_time": run_time + stats_time, "run_time": run_time, "stats_time": stats_time,
+        "simulated_time": simulator.test_otis.current_time, "requests": len(data)}
+
+def bench_dispatch(params):
+    #Otis.process_request only: every request is allocated at t = 0 without running the elevators
+    params = dict(RUN_DEFAULTS, **params)
+    requests = make_simulator(params).simulate_data()
+    otis = Otis(elevator_num = params["elevator_num"], log_sink = NullSink(), telemetry = Telemetry(mode = "changes"),
+        config = make_config(params), dispatcher = params["dispatcher"])
+    passengers = [Passenger(pick_up, drop_off, at, num) for pick_up, drop_off, at, num in requests]
+    start = time.perf_counter()
+    for passenger in passengers:
+        otis.process_request(passenger)
+    wall_time = time.perf_counter() - start
+    return {"wall_time": wall_time, "simulated_time": 0, "requests": len(passengers), "per_request": wall_time/len(passengers)}
+
+def bench_update(params):
+    #Otis.update only (the tick engine), after allocating a batch of requests at t = 0
+    params = dict(RUN_DEFAULTS, **params)
+    requests = make_simulator(params).simulate_data()
+    otis = Otis(elevator_num = params["elevator_num"], log_sink = NullSink(), telemetry = Telemetry(mode = "changes"),
+        config = make_config(params), dispatcher = params["dispatcher"])
+    for pick_up, drop_off, at, num in requests:
+        otis.process_request(Passenger(pick_up, drop_off, 0, num))
+    start = time.perf_counter()
+    for _ in range(params["ticks"]):
+        otis.update()
+    wall_time = time.perf_counter() - start
+    return {"wall_time": wall_time, "simulated_time": params["ticks"], "requests": len(requests), "per_tick": wall_time/params["ticks"]}
+
+BENCHMARKS = {"run": bench_run, "burst": bench_burst, "dispatch": bench_dispatch, "update": bench_update}
+
+def run_scenario(params, repeat = 3, trace_allocations = True):
+    #Best and median of repeat runs. Allocations are traced in one extra run since tracemalloc slows everything down
+    bench = BENCHMARKS[params["kind"]]
+    runs = [bench(params) for _ in range(repeat)]
+    best = min(runs, key = lambda run: run["wall_time"])
+    result = {"name": params["name"], "kind": params["kind"], "params": {key: value for key, value in params.items() if key not in ("name", "kind")}}
+    result.update(best)
+    result["median_wall_time"] = statistics.median(run["wall_time"] for run in runs)
+    result["sim_seconds_per_second"] = best["simulated_time"]/best["wall_time"] if best["wall_time"] else None
+    if trace_allocations:
+        tracemalloc.start()
+        bench(params)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_allocated_bytes"] = peak
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss #Kilobytes on Linux
+    return result
+
+def _run_scenario(args):
+    #Unpack arguments for the process pool
+    return run_scenario(*args)
+
+def benchmark(names = None, repeat = 3, trace_allocations = True):
+    #Run the selected scenarios (all by default), each in its own worker process, and return their results
+    scenarios = [params for params in SCENARIOS if names is None or params["name"] in names]
+    results = []
+    for params in scenarios:
+        with ProcessPoolExecutor(max_workers = 1) as pool:
+            results.append(pool.submit(_run_scenario, (params, repeat, trace_allocations)).result())
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(results, path):
+    report = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(), "results": results}
+    with open(path, "w") as f:
+        json.dump(report, f, indent = 2)
+
+def compare(results, baseline_path, threshold = 0.1):
+    #Wall time ratio of each scenario against a saved report. Returns the names of scenarios slower by more than threshold
+    with open(baseline_path) as f:
+        baseline = {result["name"]: result for result in json.load(f)["results"]}
+    regressions = []
+    print("{:<24} {:>10} {:>10} {:>8}".format("Scenario", "Baseline", "Current", "Ratio"))
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None:
+            continue
+        ratio = result["wall_time"]/old["wall_time"] if old["wall_time"] else float("inf")
+        flag = " <-- regression" if ratio > 1 + threshold else ""
+        print("{:<24} {:>10.4f} {:>10.4f} {:>8.2f}{}".format(result["name"], old["wall_time"], result["wall_time"], ratio, flag))
+        if flag:
+            regressions.append(result["name"])
+    return regressions
+
+def print_results(results):
+    print("{:<24} {:>10} {:>10} {:>14} {:>12} {:>10}".format("Scenario", "Wall (s)", "Median (s)", "Sim s / s", "Peak alloc", "RSS (MB)"))
+    for result in results:
+        rate = result["sim_seconds_per_second"]
+        alloc = result.get("peak_allocated_bytes")
+        print("{:<24} {:>10.4f} {:>10.4f} {:>14} {:>12} {:>10.1f}".format(result["name"], result["wall_time"], result["median_wall_time"],
+            "{:.0f}".format(rate) if rate else "-", "{:.1f}MB".format(alloc/2**20) if alloc is not None else "-", result["peak_rss_kb"]/1024))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", dest = "scenarios", default = None, help = "Comma separated scenarios to run. All by default: " + ", ".join(params["name"] for params in SCENARIOS))
+    parser.add_argument("--repeat", dest = "repeat", default = 3, help = "Number of timed runs per scenario")
+    parser.add_argument("--no_alloc", dest = "no_alloc", action = "store_true", help = "Skip the tracemalloc run of each scenario")
+    parser.add_argument("--output", dest = "output", default = None, help = "JSON file to save results to")
+    parser.add_argument("--compare", dest = "compare", default = None, help = "JSON file of a previous run to compare against")
+    parser.add_argument("--threshold", dest = "threshold", default = 0.1, help = "Slowdown ratio above which a scenario is reported as a regression")
+    args = parser.parse_args()
+
+    results = benchmark(args.scenarios.split(",") if args.scenarios else None, repeat = int(args.repeat), trace_allocations = not args.no_alloc)
+    print_results(results)
+    if args.output:
+        save(results, args.output)
+    if args.compare:
+        print("\n")
+        if compare(results, args.compare, threshold = float(args.threshold)):
+            sys.exit(1)
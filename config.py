@@ -0,0 +1,109 @@
+#Default building parameters
+OPENTIME = 5 #Time it takes for elevator doors to open at any floor
+LOBBYTIME = 30 #Time it takes for elevator doors to open at lobby
+
+class BuildingConfig:
+    """
+    Building parameters shared by Otis and its elevators. Each Otis gets its own config,
+    so differently configured simulations can run side by side in one process or thread pool.
+    Floors are numbered from 1 to num_floors.
+    capacity and start_floors can be a single value for all elevators or a list with one value per elevator.
+    banks optionally groups the elevators into banks (zones) of (name, floors served, number of elevators), e.g. low-rise, high-rise and express.
+    Lobby floors are served by every bank. Elevator ids are given bank by bank, and the number of elevators comes from the banks.
+    """
+    def __init__(self, num_floors = 100, lobby_floors = (1,), open_time = OPENTIME, lobby_time = LOBBYTIME, capacity = 10, floor_time = 1, start_floors = None, banks = None):
+        if num_floors < 2:
+            raise ValueError("Building needs at least 2 floors: {}".format(num_floors))
+        if floor_time < 1:
+            raise ValueError("floor_time has to be at least 1s: {}".format(floor_time))
+        self.num_floors = num_floors #Highest floor
+        self.lobby_floors = frozenset(lobby_floors) #Floors where doors stay open for lobby_time
+        self.open_time = open_time #Time it takes for elevator doors to open at any floor
+        self.lobby_time = lobby_time #Time it takes for elevator doors to open at a lobby floor
+        self.capacity = capacity #Max passengers per elevator
+        self.floor_time = floor_time #Time it takes for an elevator to travel one floor (its speed)
+        self.start_floors = start_floors if start_floors is not None else min(self.lobby_floors) #Floor each elevator starts at
+        self.banks = None #List of (name, sorted floors served, number of elevators)
+        if banks is not None:
+            self.banks = []
+            for name, floors, cars in banks:
+                floors = tuple(sorted(set(floors) | self.lobby_floors))
+                if floors[0] < 1 or floors[-1] > num_floors:
+                    raise ValueError("Bank {} serves floors outside of 1-{}".format(name, num_floors))
+                if cars < 1:
+                    raise ValueError("Bank {} needs at least 1 elevator: {}".format(name, cars))
+                self.banks.append((name, floors, cars))
+        self.floor_banks = {} #Floor -> bitmask of the banks serving it. Empty without banks
+        self.bank_capacity = [] #Largest car of each bank
+        first = 0
+        for bank, (_, floors, cars) in enumerate(self.banks or ()):
+            for floor in floors:
+                self.floor_banks[floor] = self.floor_banks.get(floor, 0) | 1 << bank
+            self.bank_capacity.append(max(self.car_capacity(elevator_id) for elevator_id in range(first, first + cars)))
+            first += cars
+
+    @classmethod
+    def zoned(cls, num_floors, zones, cars_per_zone, **kwargs):
+        #Config with zones banks of cars_per_zone elevators, each serving the lobby and a contiguous range of upper floors
+        bounds = [1 + round(i*(num_floors - 1)/zones) for i in range(zones + 1)]
+        banks = [("zone {}".format(i + 1), range(bounds[i] + 1, bounds[i + 1] + 1), cars_per_zone) for i in range(zones)]
+        return cls(num_floors = num_floors, banks = banks, **kwargs)
+
+    def num_elevators(self, default):
+        #Number of elevators given by the banks, default if there are none
+        return sum(cars for _, _, cars in self.banks) if self.banks else default
+
+    def door_time(self, floor):
+        #Time doors take to open at floor
+        return self.lobby_time if floor in self.lobby_floors else self.open_time
+
+    def car_capacity(self, elevator_id):
+        return self.capacity[elevator_id] if isinstance(self.capacity, (list, tuple)) else self.capacity
+
+    def max_capacity(self):
+        #Largest group of passengers any elevator can carry
+        return max(self.capacity) if isinstance(self.capacity, (list, tuple)) else self.capacity
+
+    def request_banks(self, pick_up, drop_off):
+        #Bitmask of the banks a request can be allocated to: those serving both of its floors (there are no transfers between banks)
+        return self.floor_banks.get(pick_up, 0) & self.floor_banks.get(drop_off, 0)
+
+    def serves(self, pick_up, drop_off):
+        #True if a single elevator can carry a request between both floors. Always the case without banks
+        return not self.banks or bool(self.request_banks(pick_up, drop_off))
+
+    def check_request(self, pick_up, drop_off, num):
+        #Raise a ValueError if a request cannot be served by this building, e.g. a floor that does not exist
+        #or a group that fits in none of the cars it can be allocated to (either would keep the simulation running forever)
+        if not (1 <= pick_up <= self.num_floors and 1 <= drop_off <= self.num_floors):
+            raise ValueError("Floors have to be between 1 and {}: {}, {}".format(self.num_floors, pick_up, drop_off))
+        if pick_up == drop_off:
+            raise ValueError("Pick-up and drop-off floors have to be different: {}".format(pick_up))
+        capacity = self.max_capacity()
+        if self.banks:
+            mask = self.request_banks(pick_up, drop_off)
+            if not mask:
+                if pick_up not in self.floor_banks:
+                    raise ValueError("No bank serves pick-up floor {}".format(pick_up))
+                raise ValueError("No bank serves both floors {} and {} (no transfers between banks)".format(pick_up, drop_off))
+            capacity = max(self.bank_capacity[bank] for bank in range(len(self.banks)) if mask >> bank & 1)
+        if not 1 <= num <= capacity:
+            raise ValueError("Number of passengers has to be between 1 and {}: {}".format(capacity, num))
+
+    def start_floor(self, elevator_id):
+        return self.start_floors[elevator_id] if isinstance(self.start_floors, (list, tuple)) else self.start_floors
+
+    def __repr__(self):
+        return "BuildingConfig(num_floors = {}, lobby_floors = {}, open_time = {}, lobby_time = {}, capacity = {}, floor_time = {}, start_floors = {}, banks = {})".format(
+            self.num_floors, tuple(sorted(self.lobby_floors)), self.open_time, self.lobby_time, self.capacity, self.floor_time, self.start_floors,
+            [(name, _floor_ranges(floors), cars) for name, floors, cars in self.banks] if self.banks else None)
+
+def _floor_ranges(floors):
+    #Sorted floors as a compact string, e.g. "1,18-34"
+    ranges = []
+    for floor in floors:
+        if ranges and ranges[-1][1] == floor - 1:
+            ranges[-1][1] = floor
+        else:
+            ranges.append([floor, floor])
+    return ",".join(str(low) if low == high else "{}-{}".format(low, high) for low, high in ranges)
@@ -0,0 +1,256 @@
+from logger import INFO
+import heapq
+
+class Dispatcher:
+    """
+    Base class of the strategies Otis uses to allocate passenger requests to elevators.
+    Subclasses either implement select (return the id of the elevator to use) or override assign entirely.
+    Requests arriving in the same tick go through assign_batch, which allocates them one by one unless a subclass groups them.
+    Subclasses with parameters return them from settings, so a snapshot can rebuild the same dispatcher.
+    """
+    def select(self, otis, passenger):
+        raise NotImplementedError
+
+    def settings(self):
+        #Constructor keyword arguments of this dispatcher (JSON-serializable)
+        return {}
+
+    def assign(self, otis, passenger):
+        #Allocate passenger to an elevator of otis and return its id
+        elevator_id = self.select(otis, passenger)
+        otis.elevators[elevator_id].add(passenger)
+        log_allocation(otis, elevator_id, passenger)
+        return elevator_id
+
+    def assign_batch(self, otis, passengers):
+        #Allocate requests arriving in the same tick and return the elevator id of each
+        return [self.assign(otis, passenger) for passenger in passengers]
+
+ALLOCATION_MESSAGE = "Added passenger query to elevator {id}. Passenger info-> Pick-up: {depart} Dest: {to} Num Passengers: {num}, Start Time: {start_time}"
+#Wording of the original allocator when no elevator was convenient (see HeapDispatcher.assign)
+FALLBACK_MESSAGE = "Added passenger query to elevator {id}. Passenger info->  Pick-up Floor: {depart} Dest Floor: {to} Num Passengers: {num}, Start Time: {start_time}"
+
+def log_allocation(otis, elevator_id, passenger, message = ALLOCATION_MESSAGE):
+    if otis.log_sink.enabled(INFO):
+        otis.log_sink.log(INFO, "allocate", message, id = elevator_id, depart = passenger.depart, to = passenger.to, num = passenger.num, start_time = passenger.start_time)
+
+class HeapDispatcher(Dispatcher):
+    """
+    Original allocation strategy, based on the pick-up metric heaps of Otis (see Elevator.mod_pick_up_metric).
+    Only the heap of a bank serving the request is used. If several banks serve it, the one whose heap top is least busy.
+    Elevators are popped in heap order until one is allocated, and only those are pushed back, instead of draining the whole heap.
+    """
+    def assign(self, otis, passenger):
+        #Logic: Request will be allocated based on how many pick-up floors each elevator has.
+        #Criterion:
+        #1) First by pick-up load (Not total number of passengers in pick-up floor)
+        #2) Convenience: Which is dictated by whether the elevator is moving in the direction of the requested pick-up floor
+        banks = [bank for bank in otis.eligible_banks(passenger) if otis.bank_capacity[bank] >= passenger.num] #Banks with a car the group fits in
+        bank = min(banks, key = otis.heap_top) if len(banks) > 1 else banks[0]
+        heap = otis.bank_heaps[bank]
+        drain = bank in otis.stale_heaps #A stale entry changes the order of later pops, so every entry is popped and refreshed like before
+        popped = []
+        seen = set()
+        allocated_id = None
+        while heap:
+            metric, elevator_id = heapq.heappop(heap)
+            if metric != otis.heap_metrics[elevator_id] or elevator_id in seen:
+                continue #Outdated entry, or a copy of an entry already popped (see Otis.heap_metrics)
+            seen.add(elevator_id)
+            curr_elevator = otis.elevators[elevator_id]
+            popped.append(curr_elevator)
+            if allocated_id is not None or curr_elevator.max_passengers < passenger.num:
+                continue #Already allocated, or a car the group could never board
+            allocated = False
+            curr_elevator_dir = curr_elevator.direction
+            if passenger.to == curr_elevator.current and curr_elevator.num_passengers + passenger.num <= curr_elevator.max_passengers:
+                #Since elevator is already at floor, just add it
+                curr_elevator.add(passenger)
+                allocated = True
+            elif passenger.to < curr_elevator.current:
+                if curr_elevator_dir == -1 or curr_elevator_dir == 0:
+                    curr_elevator.add(passenger)
+                    allocated = True
+            elif passenger.to > curr_elevator.current:
+                if curr_elevator_dir == 1 or curr_elevator_dir == 0:
+                    curr_elevator.add(passenger)
+                    allocated = True
+            if allocated:
+                allocated_id = elevator_id
+                log_allocation(otis, elevator_id, passenger)
+                if not drain:
+                    break
+        if allocated_id is None:
+            #Add to the least busy elevator. The best we can do for now
+            min_elevator = min((elevator for elevator in popped if elevator.max_passengers >= passenger.num), key = lambda elevator: (elevator.pick_up_metric, elevator.id))
+            min_elevator.add(passenger)
+            allocated_id = min_elevator.id
+            log_allocation(otis, allocated_id, passenger, FALLBACK_MESSAGE)
+            for elevator in popped:
+                if elevator is not min_elevator:
+                    otis.push_heap(bank, elevator.id, elevator.pick_up_metric)
+            #Kept from the original allocator: the entry gets the pick-up metric of the last elevator checked
+            otis.push_heap(bank, allocated_id, popped[-1].pick_up_metric)
+            if popped[-1] is not min_elevator:
+                otis.stale_heaps.add(bank)
+            else:
+                otis.stale_heaps.discard(bank)
+        else:
+            for elevator in popped:
+                otis.push_heap(bank, elevator.id, elevator.pick_up_metric)
+            otis.stale_heaps.discard(bank)
+        return allocated_id
+
+class EtaDispatcher(Dispatcher):
+    """
+    Cost based strategy: allocates the request to the elevator with the lowest estimated time to reach its pick-up floor.
+    The estimate assumes elevators keep sweeping in their current direction (serving their queued stops on the way)
+    before turning around, and counts the door dwell of every queued stop passed on the way.
+    Elevators without room for the request, counting passengers already waiting for them, get a capacity penalty.
+    Under a backlog (on average backlog or more passengers waiting per candidate elevator), every passenger in or waiting
+    for an elevator also adds load_penalty, so requests are spread by load instead of all going to the closest elevator.
+    Meant for light and moderate traffic, where it cuts waits well below HeapDispatcher. Under saturation it only matches heap
+    on average wait with a longer P99 tail, so heap stays the strategy for saturated loads.
+    """
+    def __init__(self, capacity_penalty = None, load_penalty = None, backlog = 2):
+        self.capacity_penalty = capacity_penalty #Extra cost for a full elevator. Defaults to one trip through the whole building
+        self.load_penalty = load_penalty #Extra cost per passenger of an elevator under a backlog. Defaults to one trip through the whole building
+        self.backlog = backlog #Passengers waiting per candidate elevator from which load_penalty applies
+
+    def settings(self):
+        return {"capacity_penalty": self.capacity_penalty, "load_penalty": self.load_penalty, "backlog": self.backlog}
+
+    def select(self, otis, passenger):
+        candidates = otis.candidates(passenger)
+        penalty = 0
+        if sum(elevator.waiting for elevator in candidates) >= self.backlog*len(candidates):
+            penalty = self.load_penalty
+            if penalty is None:
+                penalty = 2*otis.config.num_floors*otis.config.floor_time
+        best_id, best_cost = None, None
+        for elevator in candidates:
+            cost = self.cost(elevator, passenger) + penalty*(elevator.num_passengers + elevator.waiting)
+            if best_cost is None or cost < best_cost:
+                best_id, best_cost = elevator.id, cost
+        return best_id
+
+    def cost(self, elevator, passenger):
+        return self.eta(elevator, passenger.depart) + self.capacity_cost(elevator, passenger.num)
+
+    def capacity_cost(self, elevator, num):
+        #Penalty for every extra trip needed before num more passengers fit
+        trips = (elevator.num_passengers + elevator.waiting + num - 1)//elevator.max_passengers
+        if trips <= 0:
+            return 0
+        penalty = self.capacity_penalty
+        if penalty is None:
+            penalty = 2*elevator.config.num_floors*elevator.config.floor_time
+        return trips*penalty
+
+    def eta(self, elevator, floor):
+        #Estimated time for elevator to reach floor
+        config = elevator.config
+        current = elevator.current
+        time = 0
+        if elevator.current_state == "transferring":
+            time += elevator.buffer_time + 1 #Doors have to open and close first
+        stops = elevator.stops #Sorted pick-up and destination floors
+        direction = elevator.direction
+        if direction == 0:
+            direction = elevator.prev_direction
+        if direction == 0 or not stops:
+            return time + abs(floor - current)*config.floor_time
+
+        if (floor - current)*direction >= 0:
+            #Pick-up floor is ahead of the elevator
+            passed = stops.between(min(current, floor), max(current, floor))
+            distance = abs(floor - current)
+        else:
+            #Elevator first serves its stops ahead before turning around
+            turn = stops.max() if direction == 1 else stops.min()
+            if (turn - current)*direction < 0:
+                turn = current
+            #Every stop beyond the pick-up floor in the current direction, apart from the current floor
+            passed = stops.between(floor, stops.max() + 1) if direction == 1 else stops.between(stops.min() - 1, floor)
+            passed = [stop for stop in passed if stop != current]
+            distance = abs(turn - current) + abs(turn - floor)
+        dwell = sum(config.door_time(stop) + 1 for stop in passed)
+        return time + distance*config.floor_time + dwell
+
+class DestinationDispatcher(EtaDispatcher):
+    """
+    Destination dispatch: requests arriving in the same tick are grouped by pick-up floor, direction and destination band
+    (band floors per band) and each group is allocated to one elevator as a batch, so its passengers board together and leave at nearby floors.
+    Groups larger than a car are split into car loads, sized by the capacity of each elevator. The next car load goes to the elevator
+    adding the fewest passenger-seconds per passenger of its load: the passengers of the load wait for its ETA cost (see EtaDispatcher),
+    and every stop it does not already have (pick-up or destination floor) delays everyone in or waiting for the elevator by its door time.
+    """
+    def __init__(self, band = 1, capacity_penalty = None):
+        super().__init__(capacity_penalty)
+        self.band = band #Floors per destination band. 1 groups requests by destination floor
+
+    def settings(self):
+        return {"band": self.band, "capacity_penalty": self.capacity_penalty}
+
+    def assign(self, otis, passenger):
+        return self.assign_batch(otis, [passenger])[0]
+
+    def assign_batch(self, otis, passengers):
+        groups = {} #(pick-up floor, direction, destination band, banks) -> requests, in arrival order
+        for passenger in passengers:
+            key = (passenger.depart, 1 if passenger.to > passenger.depart else -1, (passenger.to - 1)//self.band, tuple(otis.eligible_banks(passenger)))
+            groups.setdefault(key, []).append(passenger)
+        allocated = {}
+        for group in groups.values():
+            start = 0
+            while start < len(group):
+                start += self.__assign_load(otis.candidates(group[start]), group, start, allocated)
+        for passenger in passengers:
+            log_allocation(otis, allocated[passenger], passenger)
+        return [allocated[passenger] for passenger in passengers]
+
+    def __assign_load(self, candidates, group, start, allocated):
+        #Allocate the next car load of a group (requests with the same pick-up floor) from start to one elevator. Returns its number of requests
+        loads = {} #Capacity -> (car load, passengers)
+        best, best_cost, best_load = None, None, None
+        for elevator in candidates:
+            if elevator.max_passengers not in loads:
+                loads[elevator.max_passengers] = self.__car_load(group, start, elevator.max_passengers)
+            load, num = loads[elevator.max_passengers]
+            cost = self.load_cost(elevator, load, num)/num #Per passenger, since smaller cars take smaller loads
+            if best_cost is None or cost < best_cost:
+                best, best_cost, best_load = elevator, cost, load
+        for passenger in best_load:
+            best.add(passenger)
+            allocated[passenger] = best.id
+        return len(best_load)
+
+    @staticmethod
+    def __car_load(group, start, capacity):
+        #Requests of group from start that board a car of capacity together, in arrival order
+        load, num = [], 0
+        for passenger in group[start:]:
+            if num + passenger.num > capacity:
+                break
+            load.append(passenger)
+            num += passenger.num
+        return load, num
+
+    def load_cost(self, elevator, load, num):
+        cost = (self.eta(elevator, load[0].depart) + self.capacity_cost(elevator, num))*num
+        #Every new stop delays everyone in or waiting for the elevator, including the load
+        new_stops = {passenger.to for passenger in load} | {load[0].depart}
+        dwell = sum(elevator.config.door_time(stop) + 1 for stop in new_stops if stop not in elevator.stops)
+        return cost + dwell*(elevator.num_passengers + elevator.waiting + num)
+
+DISPATCHERS = {"heap": HeapDispatcher, "eta": EtaDispatcher, "destination": DestinationDispatcher}
+
+def make_dispatcher(dispatcher):
+    #Dispatcher from its name in DISPATCHERS, or an existing Dispatcher
+    if dispatcher is None:
+        return HeapDispatcher()
+    if isinstance(dispatcher, str):
+        if dispatcher not in DISPATCHERS:
+            raise ValueError("Unknown dispatcher: {}. Options: {}".format(dispatcher, ", ".join(DISPATCHERS)))
+        return DISPATCHERS[dispatcher]()
+    return dispatcher
@@ -1,23 +1,82 @@
 from passenger import *
+from logger import DEBUG, INFO, default_sink
+from telemetry import Telemetry
+from config import BuildingConfig
+from dispatch import make_dispatcher
 from collections import defaultdict, OrderedDict
+from itertools import chain
+from bisect import bisect_left, bisect_right, insort
 import heapq
 
-#Global Variables that can be changed
-OPENTIME = 5 #Time it takes for elevator doors to open at any floor
-LOBBYTIME = 30 #Time it takes for elevator doors to open at lobby
+class StopIndex:
+    """
+    Sorted index of the floors an elevator has to stop at (pick-up or destination floors).
+    A floor can be referenced by both the pick-up and the destination floors, so each floor keeps a count
+    and is only dropped from the index once nothing references it anymore.
+    Answers min/max pending floor and next stop above/below a floor in O(log n) instead of scanning set unions.
+    """
+    def __init__(self):
+        self.floors = [] #Sorted pending floors
+        self.counts = {} #Floor -> number of references
+
+    def __len__(self):
+        return len(self.floors)
+
+    def __iter__(self):
+        return iter(self.floors)
+
+    def __contains__(self, floor):
+        return floor in self.counts
+
+    def add(self, floor):
+        count = self.counts.get(floor, 0)
+        if not count:
+            insort(self.floors, floor)
+        self.counts[floor] = count + 1
+
+    def remove(self, floor):
+        count = self.counts[floor] - 1
+        if count:
+            self.counts[floor] = count
+        else:
+            del self.counts[floor]
+            del self.floors[bisect_left(self.floors, floor)]
+
+    def min(self):
+        return self.floors[0]
+
+    def max(self):
+        return self.floors[-1]
+
+    def next_above(self, floor):
+        #Lowest pending floor above floor, None if there is none
+        idx = bisect_right(self.floors, floor)
+        return self.floors[idx] if idx < len(self.floors) else None
+
+    def next_below(self, floor):
+        #Highest pending floor below floor, None if there is none
+        idx = bisect_left(self.floors, floor)
+        return self.floors[idx - 1] if idx else None
+
+    def between(self, low, high):
+        #Pending floors strictly between low and high
+        return self.floors[bisect_right(self.floors, low):bisect_left(self.floors, high)]
 
 class Elevator:
     """
     This class represents an individual elevator and just figures out how to load and unload passengers.
     This class will only interact with the Otis class and nothing else.
     """
-    def __init__(self, start, id, max_passengers = 10, verbose = False, pick_up_mode = "requests"):
+    def __init__(self, start, id, max_passengers = 10, verbose = False, pick_up_mode = "requests", log_sink = None, telemetry = None, config = None, live_stats = None):
+        self.config = config if config is not None else BuildingConfig() #Building parameters (floors, door times, speed)
         self.current = start #current floor elevator is on
         self.id = id #Unique id for elevator
         self.time = 0 #current time (Each unit is in seconds)
         self.num_passengers = 0 #Number of passengers
         self.verbose = verbose #Verbose mode for more exact logs
+        self.log_sink = log_sink if log_sink is not None else default_sink(verbose) #Where log records are sent
         self.max_passengers = max_passengers
+        self.move_time = 0 #Time spent travelling from the current floor to the next one (see BuildingConfig.floor_time)
         self.current_state = "idle" #Different states:
         #idle: Elevator has no direction 
         #moving: Elevator is moving
@@ -26,10 +85,13 @@ class Elevator:
         #To keep track of current passengers in elevator
         self.current_passengers = defaultdict(list) #Map of destination to passenger
         self.dest_floors = set() #set of destinations of existing passengers
+        self.dest_load = defaultdict(int) #Map of destination to number of passengers leaving there
 
         #To keep track of which passengers to pick up
         self.pick_up = defaultdict(list) #Map of pick up floor to passenger
         self.pick_up_floors = set() #set of floors to pick up passengers from
+        self.waiting = 0 #Number of passengers waiting to be picked up
+        self.stops = StopIndex() #Sorted pick-up and destination floors, to find the next stop without scanning both sets
         self.pick_up_metric = 0 #Pick-up metric for elevator to determine how busy elevator is
         self.pick_up_mode = pick_up_mode #Metric mode to figure out how many pickups elevator has
 
@@ -40,35 +102,51 @@ class Elevator:
         self.direction = 0 #Direction of elevator( 0: idle, 1: going up, -1: going down)
         self.prev_direction = 0 #Keep track of previous direction before direction change
 
-        self.current_log = "Elevator {} is at {} with dir {}".format(self.id, self.current, self.direction) #Current log line
-        self.all_logs = defaultdict(list) #Logs to save all states
+        #Current log line. Only the template and its time/buffer values are stored every tick; see current_log
+        self.log_template = "Elevator {id} is at {floor} with dir {direction}"
+        self.log_time = self.time
+        self.log_buffer = 0
+        self.telemetry = telemetry if telemetry is not None else Telemetry() #Columnar store to save all states. See all_logs
+        self.live_stats = live_stats #Optional LiveStats updated at pick-up and drop-off. See livestats.py
     
     def add(self, passenger):
         #Adding the passenger to be picked up
         self.pick_up[passenger.depart].append(passenger)
-        self.pick_up_floors.add(passenger.depart)
+        if passenger.depart not in self.pick_up_floors:
+            self.pick_up_floors.add(passenger.depart)
+            self.stops.add(passenger.depart)
+        self.waiting += passenger.num
         self.mod_pick_up_metric(passenger, add = True)
+        passenger._allocate(self.id)
     
     def pickup(self):
         #When passenger/s has been picked up
         picked_up_passengers = self.pick_up[self.current]
-        self.pick_up[self.current] = []
-        self.pick_up_floors.remove(self.current)
+        left_behind = [] #Passengers that do not fit stay in the pick-up queue
         #Add new passengers
         for new_passenger in picked_up_passengers:
             if self.num_passengers + new_passenger.num <= self.max_passengers:
                 self.num_passengers += new_passenger.num #Add to elevator number of passengers
+                self.waiting -= new_passenger.num
                 self.current_passengers[new_passenger.to].append(new_passenger)
-                self.dest_floors.add(new_passenger.to)
+                self.dest_load[new_passenger.to] += new_passenger.num
+                if new_passenger.to not in self.dest_floors:
+                    self.dest_floors.add(new_passenger.to)
+                    self.stops.add(new_passenger.to)
                 self.mod_pick_up_metric(new_passenger, add = False) #Reduce pick-up metric since passenger has been picked up
                 new_passenger._pickup(self.time) #Update passenger info
+                if self.live_stats is not None:
+                    self.live_stats.pickup(new_passenger)
                 if new_passenger in self.priority:
                     self.priority.pop(new_passenger) #Remove passenger from priority queue
             else:
-                self.pick_up[self.current].append(new_passenger) #Add it back into the pick-up queue
-                self.pick_up_floors.add(self.current) #Add it back into pick-up floors set
+                left_behind.append(new_passenger)
                 if new_passenger not in self.priority:
                     self.priority[new_passenger] = self.time #Add it into the priority ordered set
+        self.pick_up[self.current] = left_behind
+        if not left_behind:
+            self.pick_up_floors.remove(self.current)
+            self.stops.remove(self.current)
 
     def mod_pick_up_metric(self, passenger, add = True):
         #Function to change the pick_up metric to be used in the Otis allocator
@@ -86,12 +164,24 @@ class Elevator:
         drop_off_passengers = self.current_passengers[self.current]
         self.current_passengers[self.current] = []
         self.dest_floors.remove(self.current) #Remove destination
+        self.stops.remove(self.current)
+        self.dest_load[self.current] = 0
         for old_passenger in drop_off_passengers:
             self.num_passengers -= old_passenger.num #Reduce current lift passengers
             old_passenger._complete(self.time)
+            if self.live_stats is not None:
+                self.live_stats.complete(old_passenger)
     
     def update_state(self):
         #Elevator update state and direction of elevator
+        if self.direction != 0 and self.move_time + 1 < self.config.floor_time:
+            #Elevator is still travelling to the next floor
+            self.move_time += 1
+            self.log_template = "Action (Elevator {id}): Moving with direction {direction} from floor {floor} at t= {time}s \n"
+            self.log_time = self.time
+            self.__end_tick()
+            return
+        self.move_time = 0
         self.current = self.current + self.direction #Update floor of elevator
 
         #Check if pick-up or dropoff and also handle the time buffer of opening and closing of elevator
@@ -99,51 +189,60 @@ class Elevator:
             #Need to buffer for opening/closing of elevator doors
             if self.current_state != "transferring":
                 self.current_state = "transferring"
-                if self.current == 1: #Account for lobby
-                    self.buffer_time = LOBBYTIME
-                else:
-                    self.buffer_time = OPENTIME
+                self.buffer_time = self.config.door_time(self.current) #Account for lobby
                 self.prev_direction = self.direction
                 self.direction = 0
                 if self.current in self.dest_floors:
-                    self.current_log = "Action (Elevator {}): Dropping-off passengers at floor {} at t= {}s with {}s left \n".format(self.id, self.current, self.time, self.buffer_time)
+                    self.log_template = "Action (Elevator {id}): Dropping-off passengers at floor {floor} at t= {time}s with {buffer_time}s left \n"
                 else:
-                    self.current_log = "Action (Elevator {}): Picking up passengers at floor {} at t= {}s with {}s left \n".format(self.id, self.current, self.time, self.buffer_time)
+                    self.log_template = "Action (Elevator {id}): Picking up passengers at floor {floor} at t= {time}s with {buffer_time}s left \n"
+                self.log_time, self.log_buffer = self.time, self.buffer_time
             else:
                 if self.buffer_time == 0:
                     if self.current in self.dest_floors and self.check_pick_up():
                         self.dropoff()
                         self.pickup()
-                        self.current_log = "Action (Elevator {}): Dropped-off and picked up passengers at floor {} at t= {}s \n".format(self.id, self.current, self.time)
+                        self.log_template = "Action (Elevator {id}): Dropped-off and picked up passengers at floor {floor} at t= {time}s \n"
                     elif self.check_pick_up():
                         self.pickup()
-                        self.current_log = "Action (Elevator {}): Picked-up passengers at floor {} at t= {}s \n".format(self.id, self.current, self.time)
+                        self.log_template = "Action (Elevator {id}): Picked-up passengers at floor {floor} at t= {time}s \n"
                     else:
                         self.dropoff()
-                        self.current_log = "Action (Elevator {}): Dropped-off passengers at floor {} at t= {}s \n".format(self.id, self.current, self.time)
+                        self.log_template = "Action (Elevator {id}): Dropped-off passengers at floor {floor} at t= {time}s \n"
+                    self.log_time = self.time
                     self.update_direction()
                     
                 else:
-                    self.current_log = "Action (Elevator {}): Waiting for doors to open with {}s left at floor {} at t= {}s \n".format(self.id, self.buffer_time, self.current, self.time-1)
+                    self.log_template = "Action (Elevator {id}): Waiting for doors to open with {buffer_time}s left at floor {floor} at t= {time}s \n"
+                    self.log_time, self.log_buffer = self.time-1, self.buffer_time
                     self.buffer_time -=1
         else:
             #Update current state and direction
             self.update_direction()
-            self.current_log = "Action (Elevator {}): Current Direction {}, at floor {} at t= {}s \n".format(self.id, self.direction, self.current,self.time)
-        
+            self.log_template = "Action (Elevator {id}): Current Direction {direction}, at floor {floor} at t= {time}s \n"
+            self.log_time = self.time
+        self.__end_tick()
+
+    def __end_tick(self):
         self.print_log_actions()
-        if self.verbose:
-            print(self.current_log)
+        if self.log_sink.enabled(DEBUG):
+            self.log_sink.log(DEBUG, "action", self.log_template, **self.log_fields())
         self.time += 1
 
+    @property
+    def current_log(self):
+        #Current log line, only formatted when it is read
+        return self.log_template.format(**self.log_fields())
+
+    def log_fields(self):
+        return {"id": self.id, "floor": self.current, "time": self.log_time, "buffer_time": self.log_buffer, "direction": self.direction}
+
     def check_pick_up(self):
         #To check if elevator can pick up at current floor.
         if self.current not in self.pick_up_floors:
             return False #No pick ups to be made on floor
         #1)Unload passengers on floor first to check capacity
-        capacity = self.num_passengers
-        for unload in self.current_passengers[self.current]:
-            capacity -= unload.num
+        capacity = self.num_passengers - self.dest_load[self.current]
 
         #2)To make sure that capacity + fairness feature gets implemented
         #Elevator continues to travel until it reaches the request that has waited the longest 
@@ -164,13 +263,13 @@ class Elevator:
         return False
                   
     def update_direction(self):
-        if len(self.pick_up_floors) + len(self.dest_floors) == 0:
+        if not self.stops:
             self.direction = 0 #Elevator currently has no pending requests.
             self.current_state ="idle"
-        elif self.current > max(self.pick_up_floors | self.dest_floors) or self.current == 100:
+        elif self.current > self.stops.max() or self.current == self.config.num_floors:
             self.direction = -1 #Elevator has reached max request floors or is currently at the highest floor
             self.current_state = "moving"
-        elif self.current < min(self.pick_up_floors | self.dest_floors) or self.current == 1:
+        elif self.current < self.stops.min() or self.current == 1:
             self.direction = 1 #Elevator has reached min request floors or is at lobby
             self.current_state = "moving"
         else:
@@ -186,18 +285,92 @@ class Elevator:
                         self.direction = self.prev_direction
                 else:
                     self.direction = self.prev_direction
+                if self.direction == 0:
+                    #Idle elevator with stops on both sides: head to the nearest one instead of stalling
+                    above, below = self.stops.next_above(self.current), self.stops.next_below(self.current)
+                    if above is not None and below is not None and self.current not in self.stops:
+                        self.direction = 1 if above - self.current < self.current - below else -1
             else:
                 self.direction = self.direction #Continue with previous direction
             self.current_state = "moving"
     
+    def skippable_ticks(self):
+        #Number of upcoming ticks in which update_state would only coast between floors or count down the door buffer.
+        #These ticks can be skipped by fast_forward without changing any passenger timings.
+        #Returns None when the elevator is idle with nothing pending (it can be skipped indefinitely)
+        if self.current_state == "idle" and self.direction == 0:
+            if not self.stops:
+                return None
+            return 0
+        if self.current_state == "transferring" and self.direction == 0:
+            return self.buffer_time #Doors still opening. Next real tick is the one where buffer_time hits 0
+        if self.current_state == "moving" and self.direction != 0:
+            #Number of floors the elevator can pass without stopping or turning around
+            if self.direction == 1:
+                above = self.stops.next_above(self.current)
+                floors = max(0, min(above, self.config.num_floors) - self.current - 1) if above is not None else 0
+            else:
+                below = self.stops.next_below(self.current)
+                floors = max(0, self.current - max(below, 1) - 1) if below is not None else 0
+            #Each floor takes floor_time ticks, on top of the ticks left to reach the next floor
+            return self.config.floor_time - self.move_time - 1 + floors*self.config.floor_time
+        return 0
+
+    def fast_forward(self, ticks):
+        #Skip a number of ticks that skippable_ticks has deemed uneventful
+        if ticks <= 0:
+            return
+        step = self.direction if self.current_state == "moving" else 0
+        self.telemetry.record_span(self.id, self.time, ticks, self.current, step, self.num_passengers, self.current_state, self.direction,
+            floor_ticks = self.config.floor_time, phase = self.move_time + 1)
+        if self.current_state == "transferring":
+            self.buffer_time -= ticks
+            self.log_template = "Action (Elevator {id}): Waiting for doors to open with {buffer_time}s left at floor {floor} at t= {time}s \n"
+            self.log_time, self.log_buffer = self.time + ticks - 2, self.buffer_time + 1
+        elif self.current_state == "moving":
+            floors, self.move_time = divmod(self.move_time + ticks, self.config.floor_time)
+            self.current += self.direction*floors
+            if self.move_time:
+                self.log_template = "Action (Elevator {id}): Moving with direction {direction} from floor {floor} at t= {time}s \n"
+            else:
+                self.log_template = "Action (Elevator {id}): Current Direction {direction}, at floor {floor} at t= {time}s \n"
+            self.log_time = self.time + ticks - 1
+        else:
+            self.log_template = "Action (Elevator {id}): Current Direction {direction}, at floor {floor} at t= {time}s \n" #As update_state leaves an idle elevator
+            self.log_time = self.time + ticks - 1
+        self.time += ticks
+
+    def advance(self, until):
+        #Event-driven equivalent of calling update_state until self.time == until
+        while self.time < until:
+            skip = self.skippable_ticks()
+            if skip is None or skip >= until - self.time:
+                self.fast_forward(until - self.time)
+            elif skip > 0:
+                self.fast_forward(skip)
+            else:
+                self.update_state()
+
+    def run_until_idle(self):
+        #Event-driven equivalent of calling update_state until the elevator becomes idle
+        while self.current_state != "idle":
+            skip = self.skippable_ticks()
+            if skip:
+                self.fast_forward(skip)
+            self.update_state()
+
+    @property
+    def all_logs(self):
+        #Logged states of this elevator as numpy arrays (floor, num_passengers, state, direction, time)
+        return self.telemetry.columns(elevator = self.id)
+
     def print_log_actions(self):
         #Add states into elevator log
-        self.all_logs["floor"].append(self.current)
-        self.all_logs["num_passengers"].append(self.num_passengers)
-        self.all_logs["state"].append(self.current_state)
-        self.all_logs["direction"].append(self.direction)
-        self.all_logs["time"].append(self.time)
-        print("Elevator ID: ",self.id, "Time:",  self.time, "Floor: ", self.current, "num_passengers: ", self.num_passengers, "Direction: ", self.direction, "State: ", self.current_state,"Dest: ", list(self.dest_floors), "Pick up: ", list(self.pick_up_floors))
+        self.telemetry.record(self.id, self.time, self.current, self.num_passengers, self.current_state, self.direction)
+        if self.log_sink.enabled(INFO):
+            self.log_sink.log(INFO, "state", "Elevator ID:  {id} Time: {time} Floor:  {floor} num_passengers:  {num_passengers} Direction:  {direction} State:  {state} Dest:  {dest} Pick up:  {pick_up}",
+                id = self.id, time = self.time, floor = self.current, num_passengers = self.num_passengers, direction = self.direction,
+                state = self.current_state, dest = list(self.dest_floors), pick_up = list(self.pick_up_floors))
 
 class Otis:
     """
@@ -206,83 +379,177 @@ class Otis:
     It will decide how to allocate passenger requests. 
     """
 
-    def __init__(self, verbose = False, elevator_num = 3, pick_up_mode = "requests"):
-        self.time_idx = [] #List to keep track of time idx
+    def __init__(self, verbose = False, elevator_num = 3, pick_up_mode = "requests", log_sink = None, telemetry = None, config = None, dispatcher = None, live_stats = None):
         self.current_time = 0 #Current time
         self.all_idle = True #True when all elevators handled by Otis are idle. Idle initially since no requests yet.
         self.verbose = verbose
-        self.elevator_num = elevator_num
+        self.config = config if config is not None else BuildingConfig() #Building parameters, shared by all elevators
+        self.elevator_num = self.config.num_elevators(elevator_num) #Given by the banks of the config if it has any
         self.pick_up_mode = pick_up_mode
+        self.dispatcher = make_dispatcher(dispatcher) #Allocation strategy. Defaults to the pick-up metric heap
+        self.log_sink = log_sink if log_sink is not None else default_sink(verbose) #Shared by all elevators
+        self.telemetry = telemetry if telemetry is not None else Telemetry() #Elevator states, shared by all elevators
+        self.live_stats = live_stats #Optional LiveStats, shared by all elevators. See livestats.py
         self.__init_elevators()
     
     def __init_elevators(self):
         self.elevators = [] #To store elevators
-        self.elevator_heap = [] #Shall use an elevator heap to keep track of priority. Used to prevent over-complication of Elevator Class
         for elevator_num in range(self.elevator_num):
-            new_elevator = Elevator(1, id = elevator_num, verbose = self.verbose, pick_up_mode = self.pick_up_mode)
-            heapq.heappush(self.elevator_heap, (0, new_elevator.id)) #Priority based on num passengers to pick-up
+            new_elevator = Elevator(self.config.start_floor(elevator_num), id = elevator_num, max_passengers = self.config.car_capacity(elevator_num), verbose = self.verbose,
+                pick_up_mode = self.pick_up_mode, log_sink = self.log_sink, telemetry = self.telemetry, config = self.config, live_stats = self.live_stats)
             self.elevators.append(new_elevator)
         self.valid_elevators = self.elevators
 
+        #Banks of elevators. Without banks in the config, a single bank serves every floor
+        banks = self.config.banks or [("all", None, self.elevator_num)]
+        self.bank_elevators = [] #Elevator ids of each bank
+        self.elevator_bank = [] #Bank of each elevator
+        self.floor_banks = self.config.floor_banks #Floor -> bitmask of the banks serving it
+        for bank, (_, floors, cars) in enumerate(banks):
+            first = len(self.elevator_bank)
+            self.bank_elevators.append(list(range(first, first + cars)))
+            self.elevator_bank.extend([bank]*cars)
+        self.bank_capacity = [max(self.elevators[elevator_id].max_passengers for elevator_id in elevator_ids) for elevator_ids in self.bank_elevators] #Largest car of each bank
+        self.min_capacity = min(elevator.max_passengers for elevator in self.elevators) #Groups up to this size fit in every car
+        #One pick-up heap per bank to keep track of priority. Used to prevent over-complication of Elevator Class
+        self.bank_heaps = [[(0, elevator_id) for elevator_id in elevator_ids] for elevator_ids in self.bank_elevators] #Priority based on num passengers to pick-up
+        self.heap_metrics = [0]*self.elevator_num #Pick-up metric of the live heap entry of each elevator. Entries with another metric are skipped (lazy deletion)
+        self.stale_heaps = set() #Banks whose heap holds an entry with an outdated pick-up metric (see HeapDispatcher)
+        self.active = set() #Ids of elevators that are not idle. Idle elevators are only brought up to date when needed
+
+    @property
+    def elevator_heap(self):
+        #Pick-up heap of the first (or only) bank
+        return self.live_heap(0)
+
+    def push_heap(self, bank, elevator_id, metric):
+        #Add the live entry of an elevator to the heap of its bank. Its previous entry is left in place and skipped from now on
+        heapq.heappush(self.bank_heaps[bank], (metric, elevator_id))
+        self.heap_metrics[elevator_id] = metric
+
+    def heap_top(self, bank):
+        #Least busy live entry of the heap of bank, dropping outdated entries on top
+        heap = self.bank_heaps[bank]
+        while heap[0][0] != self.heap_metrics[heap[0][1]]:
+            heapq.heappop(heap)
+        return heap[0]
+
+    def live_heap(self, bank):
+        #Live entries of the heap of bank, sorted (so still a heap)
+        return sorted({entry for entry in self.bank_heaps[bank] if entry[0] == self.heap_metrics[entry[1]]})
+
+    @property
+    def time_idx(self):
+        #Time idx of every tick so far. A range so it does not grow with the simulation
+        return range(1, self.current_time + 1)
+
+    def eligible_banks(self, passenger):
+        #Banks serving both floors of the request. Requests no bank serves are rejected by BuildingConfig.check_request
+        if len(self.bank_elevators) == 1:
+            return [0]
+        mask = self.config.request_banks(passenger.depart, passenger.to)
+        if not mask:
+            raise ValueError("No bank serves both floors {} and {}".format(passenger.depart, passenger.to))
+        return [bank for bank in range(len(self.bank_elevators)) if mask >> bank & 1]
+
+    def candidates(self, passenger):
+        #Elevators that can be allocated the request, in id order: cars of a bank serving it that the group fits in
+        banks = self.eligible_banks(passenger)
+        if len(banks) == 1:
+            elevators = [self.elevators[elevator_id] for elevator_id in self.bank_elevators[banks[0]]] if len(self.bank_elevators) > 1 else self.elevators
+        else:
+            elevators = [self.elevators[elevator_id] for elevator_id in sorted(elevator_id for bank in banks for elevator_id in self.bank_elevators[bank])]
+        if passenger.num > self.min_capacity:
+            elevators = [elevator for elevator in elevators if elevator.max_passengers >= passenger.num]
+        return elevators
+
     def process_request(self,passenger):
-        #Allocation of passenger request to elevators
-
-        #Logic: Request will be allocated based on how many pick-up floors each elevator has.
-        #Criterion: 
-        #1) First by pick-up load (Not total number of passengers in pick-up floor)
-        #2) Convenience: Which is dictated by whether the elevator is moving in the direction of the requested pick-up floor
-        temp_heap = []
-        allocated = False
-        while self.elevator_heap:
-            _, elevator_id = heapq.heappop(self.elevator_heap)
-            curr_elevator = self.elevators[elevator_id]
-            if allocated:
-                heapq.heappush(temp_heap, (curr_elevator.pick_up_metric, elevator_id))
-            else:
-                curr_elevator_dir = curr_elevator.direction
-                if passenger.to == curr_elevator.current and curr_elevator.num_passengers + passenger.num <= curr_elevator.max_passengers:
-                    #Since elevator is already at floor, just add it
-                    curr_elevator.add(passenger)
-                    allocated = True
-                elif passenger.to < curr_elevator.current:
-                    if curr_elevator_dir == -1 or curr_elevator_dir == 0:
-                        curr_elevator.add(passenger)
-                        allocated = True
-                elif passenger.to > curr_elevator.current:
-                    if curr_elevator_dir == 1 or curr_elevator_dir == 0:
-                        curr_elevator.add(passenger)
-                        allocated = True
-                if allocated:
-                    print("Added passenger query to elevator {}. Passenger info-> Pick-up: {} Dest: {} Num Passengers: {}, Start Time: {}".format(elevator_id, passenger.depart, passenger.to, passenger.num, passenger.start_time))
-                heapq.heappush(temp_heap, (curr_elevator.pick_up_metric, elevator_id))
-        if not allocated:
-            #Add to the first elevator. The best we can do for now
-            _, min_elevator_id = heapq.heappop(temp_heap)
-            min_elevator = self.elevators[min_elevator_id]
-            min_elevator.add(passenger)
-            print("Added passenger query to elevator {}. Passenger info->  Pick-up Floor: {} Dest Floor: {} Num Passengers: {}, Start Time: {}".format(min_elevator_id, passenger.depart, passenger.to, passenger.num, passenger.start_time))
-            heapq.heappush(temp_heap, (curr_elevator.pick_up_metric, min_elevator_id))
-        self.elevator_heap = temp_heap
+        #Allocation of passenger request to elevators, delegated to the dispatcher (see dispatch.py)
+        if self.live_stats is not None:
+            self.live_stats.arrive(passenger)
+        elevator_id = self.dispatcher.assign(self, passenger)
+        self.__activate(elevator_id)
+        return elevator_id
+
+    def process_batch(self, passengers):
+        #Allocation of all requests arriving in the same tick. Returns the elevator id of each.
+        #Same as process_request one by one, unless the dispatcher groups them (see DestinationDispatcher)
+        if self.live_stats is not None:
+            for passenger in passengers:
+                self.live_stats.arrive(passenger)
+        elevator_ids = self.dispatcher.assign_batch(self, passengers)
+        for elevator_id in set(elevator_ids):
+            self.__activate(elevator_id)
+        return elevator_ids
+
+    def __activate(self, elevator_id):
+        elevator = self.elevators[elevator_id]
+        if elevator.time < self.current_time:
+            elevator.fast_forward(self.current_time - elevator.time) #Bring an idle elevator up to date before it moves
+        self.active.add(elevator_id)
 
     def update(self):
-        #Update individual elevators as well as the logs
-        idle_list = []
-        temp_heap = []
-        for elevator_i in range(len(self.elevators)):
-            elevator = self.elevators[elevator_i]
+        #Update individual elevators as well as the logs.
+        #Idle elevators are only updated when their state is logged every tick. Otherwise they are brought up to date when needed, like with advance
+        touched = list(self.active)
+        elevators = self.elevators if self.log_sink.enabled(INFO) else [self.elevators[elevator_id] for elevator_id in sorted(touched)]
+        for elevator in elevators:
+            if elevator.time < self.current_time:
+                elevator.fast_forward(self.current_time - elevator.time) #Idle elevator left behind by advance
             elevator.update_state()
-            heapq.heappush(temp_heap, (elevator.pick_up_metric, elevator_i)) #Update the elevator pick-up heap
-            if elevator.current_state == "idle":
-                idle_list.append(True)
-            else: 
-                idle_list.append(False)
-        self.all_idle = all(idle_list) #To check if all requests have been completed.
-        self.current_time += 1
-        self.time_idx.append(self.current_time)
-        self.elevator_heap = temp_heap #Update pick-up heap
+        self.__sync_elevators(self.current_time + 1, touched)
 
+    def advance(self, until):
+        #Event-driven equivalent of calling update until self.current_time == until.
+        #Each elevator jumps straight to its next arrival or door-open completion since elevators only interact through process_request.
+        #Idle elevators are skipped, so the cost only grows with the number of busy elevators
+        if until <= self.current_time:
+            return
+        touched = sorted(self.active)
+        for elevator_id in touched:
+            self.elevators[elevator_id].advance(until)
+        self.__sync_elevators(until, touched)
 
+    def run_until_idle(self):
+        #Event-driven equivalent of calling update until all elevators are idle
+        if self.all_idle:
+            self.catch_up()
+            return
+        touched = sorted(self.active)
+        for elevator_id in touched:
+            self.elevators[elevator_id].run_until_idle()
+        until = max(self.elevators[elevator_id].time for elevator_id in touched)
+        for elevator in self.elevators:
+            elevator.advance(until) #Idle elevators just wait for the last one to finish
+        self.__sync_elevators(until, touched)
 
+    def catch_up(self):
+        #Bring idle elevators left behind by advance up to the current time, e.g. before reading telemetry or saving a snapshot
+        for elevator in self.elevators:
+            if elevator.time < self.current_time:
+                elevator.fast_forward(self.current_time - elevator.time)
 
-
-    
+    def __sync_elevators(self, until, touched):
+        #Bring the pick-up heaps and idle flag up to date the same way update used to after a tick, given the elevators that were busy.
+        #Pick-up metrics of the other elevators have not changed, so only busy elevators (and every elevator of a stale heap) get a new entry
+        #when their metric changed. Heaps are rebuilt from their live entries once outdated entries make up more than half of them
+        banks = set()
+        for elevator_id in chain(touched, *(self.bank_elevators[bank] for bank in self.stale_heaps)):
+            metric = self.elevators[elevator_id].pick_up_metric
+            if metric != self.heap_metrics[elevator_id]:
+                bank = self.elevator_bank[elevator_id]
+                self.push_heap(bank, elevator_id, metric)
+                banks.add(bank)
+        self.stale_heaps.clear()
+        for bank in banks:
+            heap = self.bank_heaps[bank]
+            if len(heap) > 2*len(self.bank_elevators[bank]):
+                heap[:] = [(self.heap_metrics[elevator_id], elevator_id) for elevator_id in self.bank_elevators[bank]]
+                heapq.heapify(heap)
+        for elevator_id in touched:
+            if self.elevators[elevator_id].current_state == "idle":
+                self.active.discard(elevator_id)
+        self.all_idle = not self.active
+        self.current_time = until
+        if self.live_stats is not None:
+            self.live_stats.observe(until)
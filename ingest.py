@@ -0,0 +1,88 @@
+import csv, json
+from itertools import groupby
+from operator import itemgetter
+
+#Accepted names for each request field in JSONL objects and CSV headers, in tuple order
+FIELD_NAMES = [("pick_up", "pick-up"), ("drop_off", "drop-off"), ("time",), ("num", "num_passengers")]
+
+def read_jsonl(path):
+    #Lazily read requests from a JSON lines file. Each line is either [pick_up, drop_off, time, num] or an object with those fields
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if isinstance(row, dict):
+                row = [_field(row, names) for names in FIELD_NAMES]
+            yield tuple(int(value) for value in row[:4])
+
+def read_csv(path):
+    #Lazily read requests from a CSV file, with or without a header row
+    with open(path, newline = "") as f:
+        reader = csv.reader(f)
+        columns = None
+        for row in reader:
+            if not row:
+                continue
+            if columns is None:
+                columns = [0, 1, 2, 3]
+                if not row[0].strip().lstrip("-").isdigit():
+                    header = [name.strip() for name in row]
+                    columns = [_column(header, names) for names in FIELD_NAMES]
+                    continue
+            yield tuple(int(row[column]) for column in columns)
+
+def iter_requests(source):
+    #Iterator of (pick_up, drop_off, time, num) tuples from a file path (.jsonl/.json/.csv) or any iterable of tuples
+    if isinstance(source, str):
+        if source.endswith(".csv"):
+            return read_csv(source)
+        if source.endswith(".jsonl") or source.endswith(".json"):
+            return read_jsonl(source)
+        raise ValueError("Unknown request file format: {}".format(source))
+    return iter(source)
+
+def validate_requests(requests, config = None):
+    #Pass requests through, raising a ValueError as soon as a timestamp goes back in time
+    #or, given the BuildingConfig, as soon as a request cannot be served (see BuildingConfig.check_request)
+    previous = None
+    for row, request in enumerate(requests):
+        time = request[2]
+        if previous is not None and time < previous:
+            raise ValueError("Request {} at t= {}s is out of order (previous request at t= {}s)".format(row, time, previous))
+        if config is not None:
+            try:
+                config.check_request(request[0], request[1], request[3])
+            except ValueError as error:
+                raise ValueError("Request {} at t= {}s is invalid: {}".format(row, time, error)) from None
+        previous = time
+        yield request
+
+def find_out_of_order(requests):
+    #Validation pass over a whole source without running it. Returns (row, time, previous time) for every out-of-order request
+    out_of_order = []
+    previous = None
+    for row, request in enumerate(requests):
+        time = request[2]
+        if previous is not None and time < previous:
+            out_of_order.append((row, time, previous))
+        else:
+            previous = time
+    return out_of_order
+
+def group_by_time(requests):
+    #Group consecutive requests with the same time: yields (time, requests at that time)
+    return groupby(requests, key = itemgetter(2))
+
+def _field(row, names):
+    for name in names:
+        if name in row:
+            return row[name]
+    raise KeyError("Request is missing field {}: {}".format(names[0], row))
+
+def _column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    raise KeyError("CSV header is missing column {}: {}".format(names[0], header))
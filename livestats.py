@@ -0,0 +1,251 @@
+"""
+Streaming statistics of a simulation, updated as passengers arrive, board and are dropped off instead of after the run.
+Every accumulator keeps a fixed or logarithmic amount of state, can be queried at any time and can be merged with the
+accumulator of another run (e.g. the seeds of a sweep running in different processes):
+1) Welford: Weighted mean and variance
+2) QuantileSketch: Log-linear histogram for percentiles, exact below 2**precision and within 2**-precision relative error above
+3) LiveStats: Wait/travel/total time, throughput per time window and queue length per floor of one or more runs
+"""
+import pandas as pd
+
+class Welford:
+    #Weighted running mean and (population) variance, as in summary_stats
+    __slots__ = ("weight", "mean", "m2")
+
+    def __init__(self):
+        self.weight = 0
+        self.mean = 0.0
+        self.m2 = 0.0 #Weighted sum of squared differences from the mean
+
+    def add(self, value, weight = 1):
+        self.weight += weight
+        delta = value - self.mean
+        self.mean += delta*weight/self.weight
+        self.m2 += weight*delta*(value - self.mean)
+
+    def merge(self, other):
+        #Add the values of other (Chan et al. parallel update)
+        if not other.weight:
+            return self
+        weight = self.weight + other.weight
+        delta = other.mean - self.mean
+        self.mean += delta*other.weight/weight
+        self.m2 += other.m2 + delta*delta*self.weight*other.weight/weight
+        self.weight = weight
+        return self
+
+    @property
+    def variance(self):
+        return self.m2/self.weight if self.weight else 0.0
+
+    @property
+    def sd(self):
+        return self.variance**0.5
+
+    def to_dict(self):
+        return {"weight": self.weight, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        welford = cls()
+        welford.weight, welford.mean, welford.m2 = data["weight"], data["mean"], data["m2"]
+        return welford
+
+class QuantileSketch:
+    """
+    Mergeable histogram of non-negative integers (times in seconds) for percentiles.
+    Values below 2**precision get a bucket each, larger ones share buckets of 2**-precision relative width,
+    so the number of buckets only grows with the log of the largest value.
+    Percentiles use the inverted cdf like weighted_percentile in runner.py, so they are exact while values are small.
+    """
+    def __init__(self, precision = 8):
+        self.precision = precision
+        self.counts = {} #Bucket -> weight
+        self.weight = 0
+        self.max = None
+
+    def bucket(self, value):
+        if value < 0:
+            raise ValueError("QuantileSketch only takes non-negative values: {}".format(value))
+        shift = int(value).bit_length() - self.precision
+        if shift <= 0:
+            return int(value)
+        return (shift << self.precision) + (int(value) >> shift)
+
+    def value(self, bucket):
+        #Middle of the values of a bucket
+        shift = bucket >> self.precision
+        if not shift:
+            return bucket
+        low = (bucket & ((1 << self.precision) - 1)) << shift
+        return low + ((1 << shift) - 1)/2
+
+    def add(self, value, weight = 1):
+        bucket = self.bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + weight
+        self.weight += weight
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precisions: {}, {}".format(self.precision, other.precision))
+        for bucket, weight in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + weight
+        self.weight += other.weight
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def percentiles(self, q):
+        #Percentiles q (0-100) of the values added so far. 0 if there are none
+        if not self.weight:
+            return [0 for _ in q]
+        buckets = sorted(self.counts)
+        results = []
+        for percentile in q:
+            target = percentile/100*self.weight
+            cumulative = 0
+            for bucket in buckets:
+                cumulative += self.counts[bucket]
+                if cumulative >= target:
+                    break
+            results.append(min(self.value(bucket), self.max))
+        return results
+
+    def to_dict(self):
+        return {"precision": self.precision, "counts": [[bucket, weight] for bucket, weight in sorted(self.counts.items())], "weight": self.weight, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(precision = data["precision"])
+        sketch.counts = {bucket: weight for bucket, weight in data["counts"]}
+        sketch.weight, sketch.max = data["weight"], data["max"]
+        return sketch
+
+class LiveStats:
+    """
+    Live statistics of a simulation, given to Otis (and Simulator or DispatchService), which updates them through:
+    arrive (request dispatched), pickup (request boarded) and complete (request dropped off).
+    1) Wait, travel and total time: weighted by the number of passengers of each request. Mean/SD for all, percentiles for wait and total time
+    2) Throughput: completed requests and passengers per window of window seconds, by drop-off time
+    3) Queue length per floor: passengers waiting now, the most that waited at once, and the average over time (total waiting time / elapsed time)
+    Queries (summary, throughput, floor_queues) can be made at any time, e.g. between ticks of the dispatch service.
+    """
+    def __init__(self, window = 300, precision = 8):
+        self.window = window #Seconds per throughput window
+        self.precision = precision
+        self.times = {name: Welford() for name in ["Wait", "Travel", "Total"]}
+        self.sketches = {name: QuantileSketch(precision) for name in ["Wait", "Total"]} #Percentiles only for the SLA metrics
+        self.queries = 0 #Completed requests
+        self.passengers = 0 #Completed passengers
+        self.windows = {} #Window index -> [completed requests, completed passengers]
+        self.queue = {} #Floor -> passengers waiting now
+        self.max_queue = {} #Floor -> most passengers waiting at once
+        self.queue_time = {} #Floor -> passenger-seconds waited (picked up passengers only)
+        self.elapsed = 0 #Simulated seconds observed. Summed over merged runs
+
+    def arrive(self, passenger):
+        #Request dispatched. Elevators have picked up everyone they could before the request time, so the queue is up to date
+        floor = passenger.depart
+        queue = self.queue.get(floor, 0) + passenger.num
+        self.queue[floor] = queue
+        if queue > self.max_queue.get(floor, 0):
+            self.max_queue[floor] = queue
+
+    def pickup(self, passenger):
+        floor = passenger.depart
+        self.queue[floor] -= passenger.num
+        self.queue_time[floor] = self.queue_time.get(floor, 0) + (passenger.pick_up - passenger.start_time)*passenger.num
+
+    def complete(self, passenger):
+        num = passenger.num
+        wait, travel = passenger.wait_time, passenger.travel_time
+        times = self.times
+        times["Wait"].add(wait, num)
+        times["Travel"].add(travel, num)
+        times["Total"].add(wait + travel, num)
+        self.sketches["Wait"].add(wait, num)
+        self.sketches["Total"].add(wait + travel, num)
+        self.queries += 1
+        self.passengers += num
+        window = self.windows.setdefault(passenger.complete//self.window, [0, 0])
+        window[0] += 1
+        window[1] += num
+
+    def observe(self, time):
+        #Simulated time reached so far, for the average queue lengths
+        self.elapsed = max(self.elapsed, time)
+
+    def merge(self, other):
+        #Add the statistics of another run. Windows, queues and elapsed time are summed, the most waiting at once is the largest of both
+        if other.window != self.window:
+            raise ValueError("Cannot merge live stats of different windows: {}, {}".format(self.window, other.window))
+        for name, welford in other.times.items():
+            self.times[name].merge(welford)
+        for name, sketch in other.sketches.items():
+            self.sketches[name].merge(sketch)
+        self.queries += other.queries
+        self.passengers += other.passengers
+        for index, (queries, passengers) in other.windows.items():
+            window = self.windows.setdefault(index, [0, 0])
+            window[0] += queries
+            window[1] += passengers
+        for floor, queue in other.queue.items():
+            self.queue[floor] = self.queue.get(floor, 0) + queue
+        for floor, queue in other.max_queue.items():
+            self.max_queue[floor] = max(self.max_queue.get(floor, 0), queue)
+        for floor, time in other.queue_time.items():
+            self.queue_time[floor] = self.queue_time.get(floor, 0) + time
+        self.elapsed += other.elapsed
+        return self
+
+    def summary(self):
+        #Same stats as summary_stats in runner.py (with percentiles from the sketches), as lists to build a DataFrame row
+        stats = {}
+        for name, welford in self.times.items():
+            stats["Average {} Time".format(name)] = [welford.mean]
+            stats["SD {} Time".format(name)] = [welford.sd]
+        for name, sketch in self.sketches.items():
+            percentiles = sketch.percentiles([50, 90, 99])
+            stats["P50 {} Time".format(name)] = [percentiles[0]]
+            stats["P90 {} Time".format(name)] = [percentiles[1]]
+            stats["P99 {} Time".format(name)] = [percentiles[2]]
+            stats["Max {} Time".format(name)] = [sketch.max if sketch.max is not None else 0]
+        stats["Total Passengers"] = [self.passengers]
+        stats["Total Queries"] = [self.queries]
+        return stats
+
+    def percentiles(self, name, q):
+        #Percentiles q (0-100) of "Wait" or "Total" time, e.g. percentiles("Wait", [50, 95, 99])
+        return self.sketches[name].percentiles(q)
+
+    def throughput(self):
+        #Completed requests and passengers per window
+        indices = sorted(self.windows)
+        return pd.DataFrame({"Queries": [self.windows[index][0] for index in indices], "Passengers": [self.windows[index][1] for index in indices]},
+            index = pd.Index([index*self.window for index in indices], name = "Window Start"))
+
+    def floor_queues(self):
+        #Queue length per floor: waiting now, most waiting at once and average over the elapsed time
+        floors = sorted(self.max_queue)
+        return pd.DataFrame({"Waiting": [self.queue.get(floor, 0) for floor in floors], "Max Waiting": [self.max_queue[floor] for floor in floors],
+            "Average Waiting": [self.queue_time.get(floor, 0)/self.elapsed if self.elapsed else 0.0 for floor in floors]},
+            index = pd.Index(floors, name = "Floor"))
+
+    def to_dict(self):
+        #JSON-serializable state, e.g. for snapshots
+        return {"window": self.window, "precision": self.precision, "times": {name: welford.to_dict() for name, welford in self.times.items()},
+            "sketches": {name: sketch.to_dict() for name, sketch in self.sketches.items()}, "queries": self.queries, "passengers": self.passengers,
+            "windows": [[index] + counts for index, counts in sorted(self.windows.items())], "queue": sorted(self.queue.items()),
+            "max_queue": sorted(self.max_queue.items()), "queue_time": sorted(self.queue_time.items()), "elapsed": self.elapsed}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(window = data["window"], precision = data["precision"])
+        stats.times = {name: Welford.from_dict(welford) for name, welford in data["times"].items()}
+        stats.sketches = {name: QuantileSketch.from_dict(sketch) for name, sketch in data["sketches"].items()}
+        stats.queries, stats.passengers, stats.elapsed = data["queries"], data["passengers"], data["elapsed"]
+        stats.windows = {index: [queries, passengers] for index, queries, passengers in data["windows"]}
+        stats.queue, stats.max_queue, stats.queue_time = dict(map(tuple, data["queue"])), dict(map(tuple, data["max_queue"])), dict(map(tuple, data["queue_time"]))
+        return stats
@@ -0,0 +1,101 @@
+import json
+
+#Log levels. Records below a sink's level are dropped before their message is formatted
+DEBUG = 10 #Per tick elevator actions, per passenger stats and generated data
+INFO = 20 #Elevator states, request allocations and simulation time
+WARNING = 30
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING"}
+
+class LogSink:
+    """
+    Base class for all log sinks. Otis, Elevator and Simulator send their log records here instead of printing them.
+    A record is made of a level, an event name, a message template and the fields used to fill the template in.
+    The template is only formatted when the sink will actually consume the record.
+    """
+    def __init__(self, level = INFO):
+        self.level = level
+
+    def enabled(self, level):
+        #Call sites check this before building expensive fields (e.g. lists of floors)
+        return level >= self.level
+
+    def log(self, level, event, template, **fields):
+        if level >= self.level:
+            self.emit(level, event, template, fields)
+
+    def emit(self, level, event, template, fields):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class NullSink(LogSink):
+    """
+    Sink that drops everything. enabled is always False so no log record is ever built.
+    """
+    def __init__(self, level = WARNING):
+        super().__init__(level)
+
+    def enabled(self, level):
+        return False
+
+    def log(self, level, event, template, **fields):
+        pass
+
+class PrintSink(LogSink):
+    """
+    Sink that prints formatted records to stdout. This is the default and matches the original print() output.
+    """
+    def emit(self, level, event, template, fields):
+        print(template.format(**fields))
+
+class FileSink(LogSink):
+    """
+    Sink that writes formatted records to a file through a large write buffer.
+    """
+    def __init__(self, path, level = INFO, buffer_size = 1 << 20):
+        super().__init__(level)
+        self.path = path
+        self.file = open(path, "w", buffering = buffer_size)
+
+    def emit(self, level, event, template, fields):
+        self.file.write(template.format(**fields))
+        self.file.write("\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+class JSONLinesSink(FileSink):
+    """
+    Sink that writes one JSON object per record with the raw fields instead of the formatted message.
+    """
+    def emit(self, level, event, template, fields):
+        record = {"level": LEVEL_NAMES.get(level, level), "event": event}
+        record.update(fields)
+        self.file.write(json.dumps(record, default = _to_json))
+        self.file.write("\n")
+
+def _to_json(value):
+    #Numpy scalars and sets are not JSON serializable by default
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+def default_sink(verbose = False):
+    #Sink used when none is given: print everything the original code printed
+    return PrintSink(level = DEBUG if verbose else INFO)
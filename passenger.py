@@ -1,23 +1,99 @@
+import numpy as np
+
 class Passenger:
-    
+
     """
     Passenger class to make it easy to keep track of passengers
+    All fields are declared in __slots__ so a request does not carry a __dict__.
+    If the passenger belongs to a RequestTable, its timings are also written to the table in place.
     """
-    def __init__(self, depart, to, start_time, num):
+    __slots__ = ("depart", "num", "to", "start_time", "state", "elevator", "pick_up", "complete", "wait_time", "travel_time", "id", "table")
+
+    def __init__(self, depart, to, start_time, num, id = None, table = None):
         self.depart = depart #Floor to pick passenger from
         self.num = num #Number of passengers in query
         self.to = to #Floor to drop passenger off
         self.start_time = start_time #Time when passenger makes a request
         self.state = 0 #State of passenger.
+        self.elevator = None #Id of elevator the request was allocated to
+        self.pick_up = None #Time that passenger is picked up
+        self.complete = None #Time that passenger is dropped off
+        self.wait_time = None #Time passenger has to wait
+        self.travel_time = None #Time passenger travelled in elevator
+        self.id = id #Row of the request in its RequestTable
+        self.table = table #RequestTable the request belongs to, if any
+
+    def _allocate(self, elevator_id):
+        self.elevator = elevator_id #Elevator the request was allocated to
+        if self.table is not None:
+            self.table.elevator[self.id] = elevator_id
 
     def _pickup(self, current_time):
         self.pick_up = current_time #Time that passenger is picked up
-    
+        if self.table is not None:
+            self.table.pick_up[self.id] = current_time
+
     def _complete(self, current_time):
         self.complete = current_time
 
-        #Compute passenger stat 
+        #Compute passenger stat
         self.wait_time = self.pick_up - self.start_time #Time passenger has to wait
         self.travel_time = self.complete - self.pick_up #Time passenger travelled in elevator
-        
-        
\ No newline at end of file
+        if self.table is not None:
+            self.table.complete[self.id] = current_time
+
+class RequestTable:
+    """
+    Struct-of-arrays store of passenger requests, indexed by request id.
+    Each request costs a fixed number of bytes in numpy columns instead of a Python object,
+    so the Simulator only has to keep Passenger objects alive while they are waiting or travelling.
+    Unknown values (elevator, pick_up, complete) are stored as -1.
+    """
+    COLUMNS = [("depart", np.int32), ("to", np.int32), ("start_time", np.int64), ("num", np.int32), ("elevator", np.int32), ("pick_up", np.int64), ("complete", np.int64)]
+
+    def __init__(self, capacity = 1024):
+        self.size = 0 #Number of requests added
+        self.capacity = max(1, capacity) #Number of requests the columns can hold before growing
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.full(self.capacity, -1, dtype = dtype))
+
+    def __len__(self):
+        return self.size
+
+    def add(self, depart, to, start_time, num):
+        #Add a request and return the Passenger that tracks it
+        if self.size == self.capacity:
+            self.__grow()
+        request_id = self.size
+        self.depart[request_id] = depart
+        self.to[request_id] = to
+        self.start_time[request_id] = start_time
+        self.num[request_id] = num
+        self.size += 1
+        return Passenger(depart, to, start_time, num, id = request_id, table = self)
+
+    def __grow(self):
+        #Double the capacity of every column
+        self.capacity *= 2
+        for name, dtype in self.COLUMNS:
+            column = np.full(self.capacity, -1, dtype = dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+
+    def column(self, name):
+        #View of a column up to the number of requests added
+        return getattr(self, name)[:self.size]
+
+    def completed(self):
+        #Mask of requests that have been dropped off
+        return self.column("complete") >= 0
+
+    def wait_time(self):
+        return self.column("pick_up") - self.column("start_time")
+
+    def travel_time(self):
+        return self.column("complete") - self.column("pick_up")
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({name: self.column(name) for name, _ in self.COLUMNS})
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from contextlib import nullcontext
+from functools import wraps
+from time import perf_counter
+
+#Phases of a simulation, in the order they are reported
+PHASES = ["ingest", "dispatch", "update", "telemetry", "logging", "summary", "other"]
+
+class Profiler:
+    """
+    Per-phase call counters and timers of a simulation (see PHASES).
+    Phases are timed with spans on the monotonic clock. Spans can be nested (e.g. telemetry inside update),
+    in which case the time of the inner span is only counted in its own phase, so the phase times add up to the total.
+    Methods of existing objects are timed by instrument, which wraps them on the instance only, leaving the classes untouched.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.times = defaultdict(float) #Phase -> seconds spent in the phase itself
+        self.calls = defaultdict(int) #Phase -> number of spans
+        self.stack = [] #Open spans: [phase, start, time spent in nested spans]
+        self.instrumented = [] #(object, method name) wrapped by instrument
+
+    def start(self, phase):
+        self.stack.append([phase, perf_counter(), 0.0])
+
+    def stop(self):
+        phase, start, nested = self.stack.pop()
+        elapsed = perf_counter() - start
+        self.times[phase] += elapsed - nested
+        self.calls[phase] += 1
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def span(self, phase):
+        #Context manager timing its block as phase
+        return _Span(self, phase)
+
+    def timed(self, phase, func):
+        #func wrapped so each call is a span of phase
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            self.start(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stop()
+        return wrapper
+
+    def instrument(self, obj, name, phase):
+        #Time every call of obj.name as phase until uninstrument is called
+        setattr(obj, name, self.timed(phase, getattr(obj, name)))
+        self.instrumented.append((obj, name))
+
+    def uninstrument(self):
+        #Remove the wrappers added by instrument
+        while self.instrumented:
+            obj, name = self.instrumented.pop()
+            delattr(obj, name)
+
+    def iterate(self, phase, iterable):
+        #Iterate over iterable, timing every next() call as phase (e.g. lazily read or generated requests)
+        iterator = iter(iterable)
+        while True:
+            self.start(phase)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.stop()
+            yield item
+
+    def to_frame(self):
+        #Per phase breakdown: number of spans, seconds and share of the total profiled time
+        import pandas as pd
+        phases = PHASES + [phase for phase in self.times if phase not in PHASES]
+        total = sum(self.times.values())
+        rows = [{"Calls": self.calls[phase], "Time (s)": self.times[phase], "Share (%)": 100*self.times[phase]/total if total else 0} for phase in phases]
+        return pd.DataFrame(rows, index = pd.Index(phases, name = "Phase"))
+
+class _Span:
+    #Context manager of Profiler.span
+    __slots__ = ("profiler", "phase")
+
+    def __init__(self, profiler, phase):
+        self.profiler = profiler
+        self.phase = phase
+
+    def __enter__(self):
+        self.profiler.start(self.phase)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.stop()
+
+class NullProfiler:
+    """
+    Profiler that records nothing (default). Nothing is wrapped, so disabled profiling adds no work to the hot paths.
+    """
+    enabled = False
+
+    def start(self, phase):
+        pass
+
+    def stop(self):
+        pass
+
+    def span(self, phase):
+        return nullcontext()
+
+    def timed(self, phase, func):
+        return func
+
+    def instrument(self, obj, name, phase):
+        pass
+
+    def uninstrument(self):
+        pass
+
+    def iterate(self, phase, iterable):
+        return iterable
+
+    def to_frame(self):
+        return None
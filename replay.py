@@ -0,0 +1,132 @@
+"""
+Replay of a request trace through several dispatch policies in a single pass, to compare them request by request.
+The trace is read (or generated) once and every batch of requests arriving at the same time is handed to one Otis per policy,
+so parsing and scheduling are shared and each extra policy only costs its own simulation.
+A policy is a pick-up mode and a dispatcher, written "pick_up_mode:dispatcher" (e.g. "requests:heap", "num_passengers:eta").
+"""
+from elevator import Otis
+from passenger import RequestTable
+from config import BuildingConfig
+from logger import NullSink
+from telemetry import Telemetry
+from ingest import iter_requests, validate_requests, group_by_time
+from workload import iter_generated
+from runner import summary_stats
+from operator import itemgetter
+import pandas as pd
+import numpy as np
+import argparse
+
+def parse_policies(text):
+    #"requests:heap,num_passengers:eta" -> [(name, pick_up_mode, dispatcher)]. The dispatcher defaults to heap
+    policies = []
+    for name in text.split(","):
+        name = name.strip()
+        pick_up_mode, _, dispatcher = name.partition(":")
+        policies.append((name, pick_up_mode, dispatcher or "heap"))
+    return policies
+
+def replay(source, policies, elevator_num = 3, config = None):
+    """
+    Run the requests of source through every policy with the event engine and return {policy name: RequestTable}.
+    source is a .jsonl/.csv trace, any time-ordered iterable of (pick_up, drop_off, time, num) tuples, or a list (sorted by time first).
+    policies are (name, pick_up_mode, dispatcher) tuples (see parse_policies). Dispatchers can be names or Dispatcher instances.
+    Request ids are the same in every table: the row of the request in the trace.
+    """
+    if isinstance(source, list):
+        source = sorted(source, key = itemgetter(2)) #Stable, so requests at the same time keep their order like in Simulator
+    config = config if config is not None else BuildingConfig()
+    names = [name for name, _, _ in policies]
+    if len(set(names)) != len(names):
+        raise ValueError("Policy names have to be unique: {}".format(", ".join(names)))
+    runs = []
+    for name, pick_up_mode, dispatcher in policies:
+        otis = Otis(elevator_num = elevator_num, pick_up_mode = pick_up_mode, log_sink = NullSink(), telemetry = Telemetry(mode = "changes"),
+            config = config, dispatcher = dispatcher)
+        runs.append((otis, RequestTable()))
+
+    for time, points in group_by_time(validate_requests(iter_requests(source), config)):
+        points = list(points)
+        for otis, table in runs:
+            otis.advance(time)
+            otis.process_batch([table.add(pick_up, drop_off, start_time, num) for pick_up, drop_off, start_time, num in points])
+            otis.advance(time + 1)
+    for otis, _ in runs:
+        otis.run_until_idle()
+    return {name: table for name, (_, table) in zip(names, runs)}
+
+def compare(tables, baseline = None):
+    """
+    Side-by-side per request frame of the replayed policies: the request, then elevator, wait and trip time of each policy.
+    Policies other than the baseline (the first one by default) also get the difference of their wait and trip time to it.
+    """
+    names = list(tables)
+    baseline = baseline if baseline is not None else names[0]
+    base = tables[baseline]
+    columns = {("Request", "Pick-up"): base.column("depart"), ("Request", "Drop-off"): base.column("to"),
+        ("Request", "Time"): base.column("start_time"), ("Request", "Num Passengers"): base.column("num")}
+    base_wait, base_trip = base.wait_time(), base.column("complete") - base.column("start_time")
+    for name in names:
+        table = tables[name]
+        wait, trip = table.wait_time(), table.column("complete") - table.column("start_time")
+        columns[(name, "Elevator")] = table.column("elevator")
+        columns[(name, "Wait Time")] = wait
+        columns[(name, "Trip Time")] = trip
+        if name != baseline:
+            columns[(name, "Wait Time Diff")] = wait - base_wait
+            columns[(name, "Trip Time Diff")] = trip - base_trip
+    return pd.DataFrame(columns, index = pd.RangeIndex(len(base), name = "Request"))
+
+def summarize(tables, baseline = None):
+    """
+    One row of summary stats per policy (as in Simulator.fetch_summary_stats) with the time the last request was completed
+    and, against the baseline (the first policy by default), the number of requests with a shorter/longer trip and the
+    average trip time difference per passenger.
+    """
+    names = list(tables)
+    baseline = baseline if baseline is not None else names[0]
+    base_trip = tables[baseline].column("complete") - tables[baseline].column("start_time")
+    rows = []
+    for name in names:
+        table = tables[name]
+        num = table.column("num")
+        row = {stat: value[0] for stat, value in summary_stats(table.wait_time(), table.travel_time(), num).items()}
+        row["Completed At"] = int(table.column("complete").max()) if len(table) else 0
+        diff = table.column("complete") - table.column("start_time") - base_trip
+        row["Faster Trips"] = int(np.count_nonzero(diff < 0))
+        row["Slower Trips"] = int(np.count_nonzero(diff > 0))
+        row["Average Trip Time Diff"] = float(np.dot(diff, num)/num.sum()) if len(table) else 0.0
+        rows.append(row)
+    return pd.DataFrame(rows, index = pd.Index(names, name = "Policy"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", dest = "input", default = None, help = "Request trace to replay (.jsonl/.csv)")
+    parser.add_argument("--test_case", dest = "test_case", default = None, help = "Replay a custom data test case of test.py instead")
+    parser.add_argument("--traffic", dest = "traffic", default = None, help = "Replay requests of the vectorized generator instead")
+    parser.add_argument("--length", dest = "length", default = 1000, help = "Number of generated requests")
+    parser.add_argument("--seed", dest = "seed", default = 1, help = "Random seed of generated requests")
+    parser.add_argument("--rate", dest = "rate", default = None, help = "Poisson arrival rate (requests per second) of generated requests")
+    parser.add_argument("--policies", dest = "policies", default = "requests:heap,num_passengers:heap", help = "Comma separated pick_up_mode:dispatcher policies. The first one is the baseline")
+    parser.add_argument("--elevator_num", dest = "elevator_num", default = 3, help = "Number of elevators")
+    parser.add_argument("--floors", dest = "floors", default = 100, help = "Number of floors")
+    parser.add_argument("--output", dest = "output", default = None, help = "CSV file to save the per request comparison to")
+    args = parser.parse_args()
+
+    if args.input:
+        source = args.input
+    elif args.test_case:
+        import test
+        source = getattr(test, "test_case_{}".format(args.test_case))
+    else:
+        source = iter_generated(int(args.length), profile = args.traffic or "poisson", num_floors = int(args.floors), random_seed = int(args.seed),
+            arrival_rate = float(args.rate) if args.rate else None)
+    tables = replay(source, parse_policies(args.policies), elevator_num = int(args.elevator_num), config = BuildingConfig(num_floors = int(args.floors)))
+    comparison = compare(tables)
+    if args.output:
+        comparison.to_csv(args.output)
+    pd.options.display.max_columns = None
+    pd.options.display.width = None
+    print(summarize(tables).round(decimals = 2).T)
+    print("\n")
+    print(comparison.head(20))
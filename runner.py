@@ -1,5 +1,12 @@
 from elevator import Otis
+from config import BuildingConfig
 from passenger import *
+from logger import DEBUG, INFO, default_sink
+from profiling import NullProfiler
+from ingest import iter_requests, validate_requests, group_by_time
+from workload import iter_generated
+from snapshot import save_snapshot, load_snapshot
+from operator import itemgetter
 import pandas as pd
 import numpy as np
 import random, math
@@ -13,18 +20,43 @@ class Simulator:
     3) Running the simulation with Otis
     4) Getting the summary stats
     """
-    def __init__(self, request_length = 3, pick_up_mode = "requests", verbose = False, test_data = None, random_seed = 1, lobby_prob = 0.2):
+    def __init__(self, request_length = 3, pick_up_mode = "requests", verbose = False, test_data = None, random_seed = 1, lobby_prob = 0.2, engine = "event", log_sink = None, telemetry = None, request_table = False, traffic_profile = None, num_floors = None, arrival_rate = None, elevator_num = 3, config = None, dispatcher = None, profiler = None, live_stats = None, retain_requests = True):
         #Elevator/Otis configuration
         self.verbose = verbose
+        self.log_sink = log_sink if log_sink is not None else default_sink(verbose) #Where logs are sent. See logger.py
+        self.telemetry = telemetry #Elevator state store. See telemetry.py
+        self.profiler = profiler if profiler is not None else NullProfiler() #Per phase timers. See profiling.py
+        self.use_request_table = request_table #Keep requests in a columnar RequestTable instead of a list of Passengers
+        self.live_stats = live_stats #Optional LiveStats updated during the run, e.g. for long simulations. See livestats.py
+        self.retain_requests = retain_requests #Keep every request for fetch_summary_stats. If False, summary stats come from live_stats
+        if not retain_requests and live_stats is None:
+            raise ValueError("Summary stats need live_stats when requests are not retained")
         self.pick_up_mode = pick_up_mode
+        self.elevator_num = elevator_num #Number of elevators handled by Otis
+        self.dispatcher = dispatcher #Allocation strategy of Otis: "heap" (default), "eta", "destination" or a Dispatcher. See dispatch.py
+        if config is None:
+            config = BuildingConfig(num_floors = num_floors) if num_floors is not None else BuildingConfig()
+        self.config = config #Building parameters. See config.py
+        self.engine = engine #Simulation engine. 2 options: "event" (jump to next event), "tick" (update every second)
         #Test Data configuration
         self.test_data = test_data #Test data for custom mode
         self.request_length = request_length #Length of simulation mode data
         self.random_seed = random_seed #Random seed
         self.lobby_prob = lobby_prob #Probability of lobby being chosen
-
+        self.traffic_profile = traffic_profile #Traffic profile of the vectorized generator (see workload.py). None keeps the original generator
+        self.num_floors = num_floors if num_floors is not None else self.config.num_floors #Number of floors of simulated requests
+        self.arrival_rate = arrival_rate #Poisson arrival rate (requests per second) of the vectorized generator
 
     def simulate_data(self):
+        if self.traffic_profile is not None:
+            data_list = list(self.__generate())
+            self.log_sink.log(DEBUG, "data", "Random Data Set ..., \n")
+            if self.log_sink.enabled(DEBUG):
+                self.log_sink.log(DEBUG, "data", "{data}", data = data_list)
+            return data_list
+
+        if self.config.banks and not all(floor in self.config.floor_banks for floor in range(1, self.num_floors)):
+            raise ValueError("Every floor needs a bank to simulate requests for it")
         random.seed(self.random_seed)
         data_list = []
         min_t = 1
@@ -35,92 +67,245 @@ class Simulator:
         for i in range(self.request_length):
             lobby_test = random.uniform(0,1)
             #lobby_prob chance of lobby being chosen
-            pickup_floor = 1 if lobby_test < (self.lobby_prob ) else random.randrange(2,100)
+            pickup_floor = 1 if lobby_test < (self.lobby_prob ) else random.randrange(2,self.num_floors)
             dropoff_floor = pickup_floor
             time = random.randint(min_t, min_t + 4) #Randomly choosing if current timestamp has a request. Could make this more flexible
-            while dropoff_floor == pickup_floor:
-                #Have to make sure dropoff and pickup are different
+            while dropoff_floor == pickup_floor or not self.config.serves(pickup_floor, dropoff_floor):
+                #Have to make sure dropoff and pickup are different (and served by the same bank)
                 lobby_test = random.uniform(0,1)
-                dropoff_floor = 1 if lobby_test < (self.lobby_prob) else random.randrange(2,100)
+                dropoff_floor = 1 if lobby_test < (self.lobby_prob) else random.randrange(2,self.num_floors)
             data_list.append((pickup_floor, dropoff_floor, int(time), int(random_passengers[i])))
             min_t = time
-        if self.verbose:
-            print("Random Data Set ..., \n")
-            print(data_list)
+        self.log_sink.log(DEBUG, "data", "Random Data Set ..., \n")
+        if self.log_sink.enabled(DEBUG):
+            self.log_sink.log(DEBUG, "data", "{data}", data = data_list)
         return data_list
 
+    def __generate(self):
+        #Vectorized generator, yielding request tuples chunk by chunk
+        return iter_generated(self.request_length, profile = self.traffic_profile, num_floors = self.num_floors,
+            lobby_prob = self.lobby_prob, arrival_rate = self.arrival_rate, random_seed = self.random_seed, config = self.config)
 
-    def run(self, mode = "simulate"):
+    def run(self, mode = "simulate", requests = None, until = None):
         #Main runner function to run simulation.
+        #Modes: "test" (test_data), "simulate" (simulate_data) and "stream".
+        #In stream mode, requests (or test_data) is a time-ordered iterable of (pick-up, drop-off, time, num_passengers) tuples
+        #or the path of a .jsonl/.csv file, which is read lazily
+        #If until is given, the simulation stops at that time instead of running until all requests are completed (see save_snapshot)
+        self.profiler.start("other") #Time of run not spent in any other phase
 
         #1) Get data
+        data_time, capacity = self.__requests(mode, requests)
+        self.all_passengers = [] #Stays empty if requests are kept in the request table or not retained
+        self.request_table = RequestTable(capacity = capacity) if self.use_request_table and self.retain_requests else None
+
+        #2) Call Otis Class
+        self.test_otis = Otis(verbose = self.verbose, elevator_num = self.elevator_num, pick_up_mode = self.pick_up_mode, log_sink = self.log_sink, telemetry = self.telemetry,
+            config = self.config, dispatcher = self.dispatcher, live_stats = self.live_stats)
+
+        #3) and 4)
+        self.__simulate(data_time, until)
+        self.profiler.stop()
+
+    def resume(self, snapshot, mode = "simulate", requests = None, until = None):
+        #Carry on with a simulation saved by save_snapshot, e.g. to fork what-if experiments from one warmed-up state.
+        #Requests are given like in run, and only those at or after the snapshot time are dispatched since the others already were.
+        #Building config and pick-up mode come from the snapshot. The dispatcher of the snapshot is kept unless this Simulator has one
+        self.profiler.start("other")
+        self.test_otis, loaded = load_snapshot(snapshot, request_table = self.use_request_table, verbose = self.verbose, log_sink = self.log_sink,
+            telemetry = self.telemetry, dispatcher = self.dispatcher, live_stats = self.live_stats)
+        self.config, self.elevator_num, self.pick_up_mode = self.test_otis.config, self.test_otis.elevator_num, self.test_otis.pick_up_mode
+        data_time, _ = self.__requests(mode, requests) #Checked against the building of the snapshot
+        self.live_stats = self.test_otis.live_stats
+        if not self.retain_requests:
+            self.request_table, self.all_passengers = None, []
+        elif self.use_request_table:
+            self.request_table, self.all_passengers = loaded, []
+        else:
+            self.request_table, self.all_passengers = None, loaded
+        resume_time = self.test_otis.current_time
+        self.__simulate(((time, points) for time, points in data_time if time >= resume_time), until)
+        self.profiler.stop()
+
+    def save_snapshot(self, path, telemetry = False, compressed = False):
+        #Save the state of the simulation (Otis, elevators and all requests) to path. See snapshot.py
+        if not self.retain_requests:
+            requests = None #Only the pending requests
+        else:
+            requests = self.request_table if self.request_table is not None else self.all_passengers
+        save_snapshot(path, self.test_otis, requests, telemetry = telemetry, compressed = compressed)
+
+    def __requests(self, mode, requests):
+        #Requests grouped by time and the expected number of requests
+        profiler = self.profiler
+        profiler.start("ingest")
+        streaming = mode == "stream" or (mode == "simulate" and self.traffic_profile is not None)
         if mode == "test":
             data = self.test_data
+        elif mode == "simulate" and streaming:
+            data = self.__generate() #Already ordered by time, so it is streamed chunk by chunk
         elif mode == "simulate":
             data = self.simulate_data()
-        
-        #Transform it into a dataframe for faster processing
-        data = pd.DataFrame(data)
-        data = data.rename(columns = {0: "pick-up", 1:"drop-off", 2:"time", 3:"num_passengers" })
-        data_time = data.groupby("time")
-        self.all_passengers = []
+        elif mode == "stream":
+            data = iter_requests(requests if requests is not None else self.test_data)
 
-        #2) Call Otis Class
-        self.test_otis = Otis(verbose = self.verbose, pick_up_mode = self.pick_up_mode)
-
-        #3) Transform data into passenger requests
-        for time, points in data_time:
-            while time > self.test_otis.current_time:
-                print("t = {}s...".format(self.test_otis.current_time))
-                self.test_otis.update()
-            print("t = {}s...".format(self.test_otis.current_time))
-            for _, point in points.iterrows():
-                passenger = Passenger(point.loc["pick-up"], point.loc["drop-off"], point.loc["time"], point.loc["num_passengers"])
-                self.test_otis.process_request(passenger)
-                self.all_passengers.append(passenger)
-            self.test_otis.update()
-
-        #4) Continue running simulation until all requests have been completed
-        while not self.test_otis.all_idle:
-            print("t = {}s...".format(self.test_otis.current_time))
-            self.test_otis.update()
+        if streaming:
+            capacity = 1024 #Unknown length, the request table grows as needed
+        else:
+            #Lists are sorted by time like before (stable, so requests at the same time keep their order)
+            data = sorted(data, key = itemgetter(2))
+            capacity = len(data)
+        data_time = group_by_time(profiler.iterate("ingest", validate_requests(data, self.config))) #Lazily read/generated requests are timed row by row as they are pulled
+        profiler.stop()
+        return data_time, capacity
+
+    def __simulate(self, data_time, until = None):
+        #Feed the requests to Otis and run the elevators
+        profiler = self.profiler
+        for name in ["process_request", "process_batch"]:
+            profiler.instrument(self.test_otis, name, "dispatch")
+        for name in ["update", "advance", "run_until_idle"]:
+            profiler.instrument(self.test_otis, name, "update")
+        for name in ["record", "record_span"]:
+            profiler.instrument(self.test_otis.telemetry, name, "telemetry")
+        profiler.instrument(self.log_sink, "log", "logging")
+
+        try:
+            #3) Transform data into passenger requests
+            for time, points in data_time:
+                if until is not None and time >= until:
+                    break #Later requests are left for resume
+                if self.engine == "event":
+                    self.test_otis.advance(time) #Jump straight to the next request time
+                else:
+                    while time > self.test_otis.current_time:
+                        self.log_sink.log(INFO, "tick", "t = {time}s...", time = self.test_otis.current_time)
+                        self.test_otis.update()
+                self.log_sink.log(INFO, "tick", "t = {time}s...", time = self.test_otis.current_time)
+                batch = []
+                for pick_up, drop_off, start_time, num_passengers in points:
+                    if self.request_table is not None:
+                        passenger = self.request_table.add(pick_up, drop_off, start_time, num_passengers)
+                    else:
+                        passenger = Passenger(pick_up, drop_off, start_time, num_passengers)
+                        if self.retain_requests:
+                            self.all_passengers.append(passenger)
+                    batch.append(passenger)
+                self.test_otis.process_batch(batch) #Requests of the same tick are dispatched together
+                if self.engine == "event":
+                    self.test_otis.advance(time + 1) #Same as update, without touching idle elevators
+                else:
+                    self.test_otis.update()
+
+            #4) Continue running simulation until all requests have been completed (or until the given time)
+            if until is not None:
+                if self.engine == "event":
+                    self.test_otis.advance(until)
+                else:
+                    while until > self.test_otis.current_time:
+                        self.log_sink.log(INFO, "tick", "t = {time}s...", time = self.test_otis.current_time)
+                        self.test_otis.update()
+            elif self.engine == "event":
+                self.test_otis.run_until_idle()
+            else:
+                while not self.test_otis.all_idle:
+                    self.log_sink.log(INFO, "tick", "t = {time}s...", time = self.test_otis.current_time)
+                    self.test_otis.update()
+            self.test_otis.catch_up() #Idle elevators are only brought up to date when needed (see Otis.advance and Otis.update)
+        finally:
+            profiler.uninstrument() #Even if a request is invalid or the run is interrupted, so Otis and the log sink are left as they were
     
-    def fetch_summary_stats(self):
+    def fetch_summary_stats(self, by_elevator = False, by_hour = False):
         #Stats per passenger
         #For time statistics, we have average as well as standard deviation to track performance of Elevator/Otis algo
-        total_wait_time = np.array([])
-        total_elevator_time = np.array([])
-        total_time = np.array([])
-        total_passengers = 0
-        total_queries = 0
-        for passenger in self.all_passengers:
-            wait_time = passenger.wait_time
-            elevator_time = passenger.travel_time
-            trip_time = wait_time + elevator_time
-            num_passengers = passenger.num
-            if self.verbose:
-                print("Wait Time: ", wait_time, "Travel Time: ", elevator_time, "Trip Time: ", trip_time, "Start Time: ", passenger.start_time, "Depart Floor: ", passenger.depart, "Dest Floor: ", passenger.to)
-
-            total_wait_time = np.append(total_wait_time, [wait_time] * num_passengers)
-            total_elevator_time = np.append(total_elevator_time, [elevator_time] * num_passengers)
-            total_time = np.append(total_time, [trip_time] * num_passengers)
-            total_passengers += num_passengers
-            total_queries += 1
-        
+        #Each query is weighted by its number of passengers instead of being repeated num_passengers times
+        self.profiler.start("summary")
         pd.options.display.max_columns = None
-        if total_passengers == 0:
-            self.summary_df = pd.DataFrame({"Average Wait Time": [0], "Variance Wait Time": [0], \
-                "Average Travel Time": [0], "SD Travel Time": [0],\
-                    "Average Total Time": [0], "SD Total Time": [0],\
-                        "Total Passengers": [0], \
-                            "Total Queries": [0]}, index = ["Summary"])
+        if self.retain_requests:
+            self.__summarize_requests(by_elevator, by_hour)
         else:
-            self.summary_df = pd.DataFrame({"Average Wait Time": [np.sum(total_wait_time)/total_passengers],
-            "SD Wait Time": [(np.sum(total_wait_time**2)/total_passengers - (np.sum(total_wait_time)/total_passengers)**2)**0.5],
-            "Average Travel Time": [np.sum(total_elevator_time)/total_passengers],
-            "SD Travel Time": [(np.sum(total_elevator_time**2)/total_passengers - (np.sum(total_elevator_time)/total_passengers)**2)**0.5],
-            "Average Total Time": [np.sum(total_time)/total_passengers],
-            "SD Total Time": [(np.sum(total_time**2)/total_passengers - (np.sum(total_time)/total_passengers)**2)**0.5],
-            "Total Passengers": [total_passengers],
-            "Total Queries": [total_queries]}, index = ["Summary"])
+            #Requests were not kept: stats (with percentiles within the sketch precision) come from live_stats
+            if by_elevator or by_hour:
+                raise ValueError("by_elevator and by_hour need the requests to be retained")
+            self.summary_df = pd.DataFrame(self.live_stats.summary(), index = ["Summary"])
+        if self.live_stats is not None:
+            self.throughput_df = self.live_stats.throughput() #Completed requests/passengers per window
+            self.floor_queue_df = self.live_stats.floor_queues() #Queue length per floor
+        self.profiler.stop()
+        self.profile_df = self.profiler.to_frame() #Per phase breakdown, None unless a Profiler is given
+
+    def __summarize_requests(self, by_elevator, by_hour):
+        requests = self.__request_columns()
+        wait_time, travel_time, num_passengers = requests["wait_time"], requests["travel_time"], requests["num"]
+        if self.log_sink.enabled(DEBUG):
+            for i in range(len(num_passengers)):
+                self.log_sink.log(DEBUG, "passenger", "Wait Time:  {wait_time} Travel Time:  {travel_time} Trip Time:  {trip_time} Start Time:  {start_time} Depart Floor:  {depart} Dest Floor:  {to}",
+                    wait_time = wait_time[i], travel_time = travel_time[i], trip_time = wait_time[i] + travel_time[i],
+                    start_time = requests["start_time"][i], depart = requests["depart"][i], to = requests["to"][i])
+        self.summary_df = pd.DataFrame(summary_stats(wait_time, travel_time, num_passengers), index = ["Summary"])
+
+        #Optional breakdowns, one row per elevator / per hour of request time
+        if by_elevator:
+            self.elevator_summary_df = grouped_summary_stats(requests["elevator"], wait_time, travel_time, num_passengers, "Elevator")
+        if by_hour:
+            self.hourly_summary_df = grouped_summary_stats(requests["start_time"] // 3600, wait_time, travel_time, num_passengers, "Hour")
+
+    def __request_columns(self):
+        #Arrays of completed requests, read from the request table or gathered from the passengers
+        if self.request_table is not None:
+            table = self.request_table
+            done = table.completed()
+            columns = {name: table.column(name)[done] for name in ["depart", "to", "start_time", "num", "elevator"]}
+            columns["wait_time"] = table.wait_time()[done]
+            columns["travel_time"] = table.travel_time()[done]
+            return columns
+        done = [passenger for passenger in self.all_passengers if passenger.complete is not None] #run(until = ...) can leave requests unfinished
+        columns = {}
+        for name, dtype in [("depart", np.int64), ("to", np.int64), ("start_time", np.int64), ("num", np.int64), ("elevator", np.int64), ("wait_time", np.int64), ("travel_time", np.int64)]:
+            columns[name] = np.fromiter((getattr(passenger, name) for passenger in done), dtype = dtype, count = len(done))
+        return columns
+
+def weighted_percentile(values, weights, q):
+    #Percentile of values where each value is repeated weights times (inverted cdf, i.e. no interpolation)
+    order = np.argsort(values, kind = "stable")
+    cumulative = np.cumsum(weights[order])
+    targets = np.asarray(q, dtype = np.float64)/100*cumulative[-1]
+    idx = np.searchsorted(cumulative, targets, side = "left")
+    return values[order][np.minimum(idx, len(values) - 1)]
+
+def summary_stats(wait_time, travel_time, num_passengers):
+    #Weighted summary stats of arrays of wait time, travel time and group size (one entry per query)
+    total_passengers = int(np.sum(num_passengers))
+    stats = {}
+    times = [("Wait", wait_time), ("Travel", travel_time), ("Total", wait_time + travel_time)]
+    for name, values in times:
+        if total_passengers == 0:
+            stats["Average {} Time".format(name)] = [0]
+            stats["SD {} Time".format(name)] = [0]
+            continue
+        mean = np.dot(values, num_passengers)/total_passengers
+        stats["Average {} Time".format(name)] = [mean]
+        stats["SD {} Time".format(name)] = [(np.dot(values**2, num_passengers)/total_passengers - mean**2)**0.5]
+    for name, values in times:
+        if name == "Travel":
+            continue #Percentiles only for the SLA metrics: wait and trip time
+        percentiles = weighted_percentile(values, num_passengers, [50, 90, 99]) if total_passengers else [0, 0, 0]
+        stats["P50 {} Time".format(name)] = [percentiles[0]]
+        stats["P90 {} Time".format(name)] = [percentiles[1]]
+        stats["P99 {} Time".format(name)] = [percentiles[2]]
+        stats["Max {} Time".format(name)] = [np.max(values) if total_passengers else 0]
+    stats["Total Passengers"] = [total_passengers]
+    stats["Total Queries"] = [len(num_passengers)]
+    return stats
 
+def grouped_summary_stats(groups, wait_time, travel_time, num_passengers, group_name):
+    #Summary stats per group (e.g. elevator or hour). Sorting once keeps each group a contiguous slice
+    order = np.argsort(groups, kind = "stable")
+    groups = groups[order]
+    wait_time, travel_time, num_passengers = wait_time[order], travel_time[order], num_passengers[order]
+    keys, starts = np.unique(groups, return_index = True)
+    ends = np.append(starts[1:], len(groups))
+    rows = []
+    for start, end in zip(starts, ends):
+        rows.append({name: value[0] for name, value in summary_stats(wait_time[start:end], travel_time[start:end], num_passengers[start:end]).items()})
+    return pd.DataFrame(rows, index = pd.Index(keys, name = group_name))
@@ -0,0 +1,249 @@
+from elevator import Otis
+from passenger import Passenger, RequestTable
+from config import BuildingConfig
+from logger import NullSink
+from telemetry import Telemetry
+from ingest import iter_requests
+from workload import iter_generated
+from runner import summary_stats
+from livestats import LiveStats
+from collections import deque
+import numpy as np
+import argparse, asyncio, json
+
+class DispatchService:
+    """
+    Real-time dispatch service around Otis. Requests arrive concurrently (in-process through enqueue/submit or as JSON lines
+    on a local socket, see serve) and wait in a bounded queue. A clock task runs Otis on the wall clock, sped up by speed:
+    every tick, all requests queued since the previous tick are dispatched together through process_batch and the elevators are updated.
+    If the clock task falls behind, the missed ticks are caught up with the event engine (Otis.advance).
+    Backpressure: enqueue/submit wait for room in the queue, submit_nowait rejects requests when it is full.
+    Wait/trip time percentiles, throughput and floor queues are kept in live_stats, so a long-running service can drop
+    finished requests (retain_requests = False) and still report them.
+    """
+    def __init__(self, speed = 1.0, elevator_num = 3, pick_up_mode = "requests", config = None, dispatcher = None, log_sink = None, telemetry = None,
+        max_queue = 10000, latency_window = 100000, live_stats = None, retain_requests = True):
+        self.speed = speed #Simulated seconds per wall-clock second
+        self.live_stats = live_stats if live_stats is not None else LiveStats() #Wait/trip times, throughput and floor queues. See livestats.py
+        self.otis = Otis(elevator_num = elevator_num, pick_up_mode = pick_up_mode, log_sink = log_sink if log_sink is not None else NullSink(),
+            telemetry = telemetry if telemetry is not None else Telemetry(mode = "changes"), config = config, dispatcher = dispatcher, live_stats = self.live_stats)
+        self.config = self.otis.config
+        self.requests = RequestTable() if retain_requests else None #Every dispatched request, indexed by request id. None if not retained
+        self.dispatched = 0 #Requests dispatched, also the id of the next one
+        self.queue = asyncio.Queue(maxsize = max_queue) #Requests waiting for the next tick: (pick_up, drop_off, num, arrival, future)
+        self.latencies = deque(maxlen = latency_window) #Wall seconds from arrival to dispatch of the most recent requests
+        self.accepted = 0 #Requests queued
+        self.rejected = 0 #Requests refused by submit_nowait because the queue was full
+        self.max_lag = 0.0 #Largest delay of a tick behind the clock (wall seconds)
+        self.start_time = None #Wall time of tick 0. Set when the clock starts
+        self.running = False
+
+    def validate(self, pick_up, drop_off, num):
+        #Same checks as streamed requests (see BuildingConfig.check_request), so a request that could never be served is refused
+        self.config.check_request(pick_up, drop_off, num)
+
+    async def enqueue(self, pick_up, drop_off, num = 1):
+        #Queue a request, waiting for room in the queue. Returns a future of (request id, elevator id, time) set once it is dispatched
+        self.validate(pick_up, drop_off, num)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self.queue.put((pick_up, drop_off, num, loop.time(), future))
+        self.accepted += 1
+        return future
+
+    async def submit(self, pick_up, drop_off, num = 1):
+        #Queue a request and wait until it is dispatched. Returns (request id, elevator id, time)
+        return await (await self.enqueue(pick_up, drop_off, num))
+
+    def submit_nowait(self, pick_up, drop_off, num = 1):
+        #Queue a request without waiting. Raises asyncio.QueueFull when the service is overloaded
+        self.validate(pick_up, drop_off, num)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self.queue.put_nowait((pick_up, drop_off, num, loop.time(), future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        self.accepted += 1
+        return future
+
+    def wall_time(self, tick):
+        #Wall time at which the clock reaches tick
+        return self.start_time + tick/self.speed
+
+    async def run(self):
+        #Clock loop. Runs until stop is called
+        loop = asyncio.get_running_loop()
+        otis = self.otis
+        self.start_time = loop.time() - otis.current_time/self.speed
+        self.running = True
+        while self.running:
+            now = loop.time()
+            self.max_lag = max(self.max_lag, now - self.wall_time(otis.current_time))
+            target = int((now - self.start_time)*self.speed) #Tick the clock is at
+            if target > otis.current_time:
+                otis.advance(target) #Catch up on missed ticks. Requests queued meanwhile are dispatched at target
+            self.__dispatch_queued(now)
+            otis.advance(otis.current_time + 1) #Same as update, without touching idle elevators
+            await asyncio.sleep(max(0.0, self.wall_time(otis.current_time) - loop.time()))
+
+    def stop(self):
+        self.running = False
+
+    def __dispatch_queued(self, now):
+        #Dispatch every queued request at the current tick, as one batch
+        otis = self.otis
+        queue = self.queue
+        batch, waiting = [], []
+        while not queue.empty():
+            pick_up, drop_off, num, arrival, future = queue.get_nowait()
+            if self.requests is not None:
+                batch.append(self.requests.add(pick_up, drop_off, otis.current_time, num))
+            else:
+                batch.append(Passenger(pick_up, drop_off, otis.current_time, num, id = self.dispatched + len(batch)))
+            waiting.append((arrival, future))
+        if not batch:
+            return
+        elevator_ids = otis.process_batch(batch)
+        self.dispatched += len(batch)
+        for passenger, elevator_id, (arrival, future) in zip(batch, elevator_ids, waiting):
+            self.latencies.append(now - arrival)
+            if not future.cancelled():
+                future.set_result((passenger.id, elevator_id, otis.current_time))
+
+    def state(self):
+        #Current state of every car
+        return {"time": self.otis.current_time, "elevators": [{"id": elevator.id, "floor": elevator.current, "direction": elevator.direction,
+            "state": elevator.current_state, "num_passengers": elevator.num_passengers, "pick_up": sorted(elevator.pick_up_floors),
+            "dest": sorted(elevator.dest_floors)} for elevator in self.otis.elevators]}
+
+    def stats(self):
+        #Throughput, backpressure and latency metrics, and SLA metrics of the completed requests (simulated seconds)
+        latencies = np.fromiter(self.latencies, dtype = np.float64, count = len(self.latencies))
+        percentiles = np.percentile(latencies, [50, 99])*1000 if len(latencies) else [0.0, 0.0]
+        live_stats = self.live_stats
+        wait = live_stats.percentiles("Wait", [50, 95, 99])
+        total = live_stats.percentiles("Total", [50, 95, 99])
+        return {"time": self.otis.current_time, "accepted": self.accepted, "rejected": self.rejected, "dispatched": self.dispatched,
+            "completed": live_stats.queries, "queue_depth": self.queue.qsize(),
+            "latency_p50_ms": float(percentiles[0]), "latency_p99_ms": float(percentiles[1]), "latency_max_ms": float(latencies.max()*1000) if len(latencies) else 0.0,
+            "max_tick_lag_ms": self.max_lag*1000, "average_wait": live_stats.times["Wait"].mean, "wait_p50": wait[0], "wait_p95": wait[1], "wait_p99": wait[2],
+            "average_total": live_stats.times["Total"].mean, "total_p50": total[0], "total_p95": total[1], "total_p99": total[2],
+            "waiting": sum(live_stats.queue.values())}
+
+    def idle(self):
+        #True when nothing is queued, waiting or travelling
+        return self.queue.empty() and self.otis.all_idle
+
+    async def serve(self, host = "127.0.0.1", port = 8765):
+        """
+        Run the clock and a socket server speaking JSON lines until cancelled:
+        1) Requests: {"pick_up": 1, "drop_off": 5, "num": 2, "id": <anything>} or [pick_up, drop_off, num].
+           Answered with {"id", "request", "elevator", "time"} once dispatched, or {"id", "error"}
+        2) Queries: {"query": "state"} or {"query": "stats"}
+        Requests of one connection are read as fast as the queue accepts them, so a full queue slows down the client (backpressure).
+        """
+        server = await asyncio.start_server(self.__handle, host, port)
+        clock = asyncio.create_task(self.run())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.stop()
+            await clock
+
+    async def __handle(self, reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            client_id = None
+            try:
+                message = json.loads(line)
+                if isinstance(message, dict) and "query" in message:
+                    if message["query"] not in ("state", "stats"):
+                        raise ValueError("Unknown query: {}".format(message["query"]))
+                    _write(writer, self.state() if message["query"] == "state" else self.stats())
+                    continue
+                if isinstance(message, dict):
+                    client_id = message.get("id")
+                    pick_up, drop_off, num = int(message["pick_up"]), int(message["drop_off"]), int(message.get("num", 1))
+                else:
+                    pick_up, drop_off, num = (int(value) for value in message)
+                future = await self.enqueue(pick_up, drop_off, num)
+            except (ValueError, KeyError, TypeError) as error:
+                _write(writer, {"id": client_id, "error": str(error)})
+                continue
+            future.add_done_callback(lambda done, client_id = client_id: _write(writer, _reply(client_id, done.result())))
+            await writer.drain()
+        writer.close()
+
+def _reply(client_id, result):
+    request_id, elevator_id, time = result
+    return {"id": client_id, "request": request_id, "elevator": elevator_id, "time": time}
+
+def _write(writer, message):
+    if not writer.is_closing():
+        writer.write((json.dumps(message) + "\n").encode())
+
+async def replay(service, requests):
+    """
+    Load test: submit time-ordered (pick_up, drop_off, time, num) requests on the service clock, shifted so the first one arrives now,
+    and wait until all of them are dispatched. Returns their (request id, elevator id, time).
+    """
+    loop = asyncio.get_running_loop()
+    futures = []
+    offset = None
+    for pick_up, drop_off, time, num in requests:
+        if offset is None:
+            offset = service.otis.current_time - time
+        delay = service.wall_time(time + offset) - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        futures.append(await service.enqueue(pick_up, drop_off, num))
+    return await asyncio.gather(*futures)
+
+async def replay_and_wait(service, requests):
+    #Run the clock, replay requests and wait until every request has been completed
+    clock = asyncio.create_task(service.run())
+    await asyncio.sleep(0) #Let the clock start
+    await replay(service, requests)
+    while not service.idle():
+        await asyncio.sleep(1/service.speed)
+    service.stop()
+    await clock
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", dest = "host", default = "127.0.0.1", help = "Address to listen on")
+    parser.add_argument("--port", dest = "port", default = 8765, help = "Port to listen on")
+    parser.add_argument("--speed", dest = "speed", default = 1.0, help = "Simulated seconds per wall-clock second")
+    parser.add_argument("--elevator_num", dest = "elevator_num", default = 3, help = "Number of elevators")
+    parser.add_argument("--floors", dest = "floors", default = 100, help = "Number of floors")
+    parser.add_argument("--dispatcher", dest = "dispatcher", default = "heap", help = "Allocation strategy. Takes in 3 values: heap, eta, destination")
+    parser.add_argument("--max_queue", dest = "max_queue", default = 10000, help = "Number of requests that can wait for the next tick")
+    parser.add_argument("--replay", dest = "replay", default = None, help = "Replay a .jsonl/.csv request file in-process instead of serving")
+    parser.add_argument("--traffic", dest = "traffic", default = None, help = "Replay requests of the vectorized generator in-process instead of serving")
+    parser.add_argument("--length", dest = "length", default = 1000, help = "Number of generated requests to replay")
+    parser.add_argument("--rate", dest = "rate", default = None, help = "Poisson arrival rate (requests per second) of generated requests")
+    args = parser.parse_args()
+
+    service = DispatchService(speed = float(args.speed), elevator_num = int(args.elevator_num), config = BuildingConfig(num_floors = int(args.floors)),
+        dispatcher = args.dispatcher, max_queue = int(args.max_queue))
+    if args.replay or args.traffic:
+        if args.replay:
+            requests = iter_requests(args.replay)
+        else:
+            requests = iter_generated(int(args.length), profile = args.traffic, num_floors = int(args.floors), arrival_rate = float(args.rate) if args.rate else None)
+        asyncio.run(replay_and_wait(service, requests))
+        for name, value in service.stats().items():
+            print("{}: {}".format(name, round(value, 3) if isinstance(value, float) else value))
+        table = service.requests
+        print(json.dumps({name: round(float(value[0]), 2) for name, value in summary_stats(table.wait_time(), table.travel_time(), table.column("num")).items()}))
+        print(service.live_stats.throughput())
+    else:
+        try:
+            asyncio.run(service.serve(args.host, int(args.port)))
+        except KeyboardInterrupt:
+            pass
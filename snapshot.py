@@ -0,0 +1,177 @@
+"""
+Snapshot and restore of a whole simulation (Otis, its elevators and the passenger requests) at any tick.
+A snapshot is a .npz file of typed columns plus a small JSON header, instead of pickled objects:
+1) requests: One row per request (depart, to, start_time, num, elevator, pick_up, complete), -1 for unknown values like in RequestTable
+2) elevators: One row per elevator of scalar state (see ELEVATOR_FIELDS)
+3) pick_up, current_passengers and priority queues: One row per queued request, in queue order, pointing to its row in requests
+4) Otis: current time, idle flag and pick-up heaps. Building config, pick-up mode and dispatcher (name and settings) are saved in the header
+Telemetry is optional since it is a log of the past rather than state needed to carry on. Live stats (see livestats.py) are saved in the header.
+"""
+from elevator import Otis
+from passenger import Passenger, RequestTable
+from config import BuildingConfig
+from dispatch import DISPATCHERS
+from telemetry import Telemetry, STATES, STATE_CODES
+from livestats import LiveStats
+import numpy as np
+import json
+
+SNAPSHOT_VERSION = 1
+
+#Per elevator scalar state saved as one column each
+ELEVATOR_FIELDS = ["current", "time", "num_passengers", "max_passengers", "move_time", "direction", "prev_direction", "buffer_time", "pick_up_metric", "waiting", "log_time", "log_buffer"]
+
+def save_snapshot(path, otis, requests = None, telemetry = False, compressed = False):
+    """
+    Save the state of otis to path.
+    requests are all the requests of the simulation (a list of Passengers or a RequestTable) so completed requests are kept as well.
+    If None, only the requests still waiting or travelling in an elevator are saved.
+    Idle elevators are brought up to the current time first (see Otis.catch_up).
+    """
+    otis.catch_up()
+    if isinstance(requests, RequestTable):
+        columns = {name: requests.column(name) for name, _ in RequestTable.COLUMNS}
+        ref = lambda passenger: passenger.id
+    else:
+        if requests is None:
+            requests = _pending_passengers(otis)
+        index = {id(passenger): i for i, passenger in enumerate(requests)}
+        columns = {name: np.fromiter((_value(getattr(passenger, name)) for passenger in requests), dtype = dtype, count = len(requests))
+            for name, dtype in RequestTable.COLUMNS}
+        ref = lambda passenger: index[id(passenger)]
+
+    arrays = {"request_" + name: column for name, column in columns.items()}
+    elevators = otis.elevators
+    for name in ELEVATOR_FIELDS:
+        arrays["elevator_" + name] = np.array([getattr(elevator, name, 0) for elevator in elevators], dtype = np.int64)
+    arrays["elevator_state"] = np.array([STATE_CODES[elevator.current_state] for elevator in elevators], dtype = np.int8)
+    #Queues as (elevator, floor or time, request) rows
+    arrays["pick_up"] = _queue_rows((elevator.id, floor, ref(passenger)) for elevator in elevators for floor, queue in elevator.pick_up.items() for passenger in queue)
+    arrays["current_passengers"] = _queue_rows((elevator.id, floor, ref(passenger)) for elevator in elevators for floor, queue in elevator.current_passengers.items() for passenger in queue)
+    arrays["priority"] = _queue_rows((elevator.id, time, ref(passenger)) for elevator in elevators for passenger, time in elevator.priority.items())
+    arrays["elevator_heap"] = np.array([entry for bank in range(len(otis.bank_heaps)) for entry in otis.live_heap(bank)], dtype = np.int64).reshape(-1, 2) #Live entries of the pick-up heaps of all banks, in bank order
+
+    config = otis.config
+    header = {"version": SNAPSHOT_VERSION, "current_time": otis.current_time, "all_idle": otis.all_idle, "pick_up_mode": otis.pick_up_mode,
+        "elevator_num": otis.elevator_num, "dispatcher": _dispatcher_name(otis.dispatcher), "dispatcher_settings": otis.dispatcher.settings(), "requests": len(columns["depart"]), "stale_heaps": sorted(otis.stale_heaps),
+        "log_templates": [elevator.log_template for elevator in elevators],
+        "config": {"num_floors": config.num_floors, "lobby_floors": sorted(config.lobby_floors), "open_time": config.open_time, "lobby_time": config.lobby_time,
+            "capacity": config.capacity, "floor_time": config.floor_time, "start_floors": config.start_floors, "banks": config.banks}}
+    if otis.live_stats is not None:
+        header["live_stats"] = otis.live_stats.to_dict()
+    if telemetry:
+        header["telemetry"] = {"mode": otis.telemetry.mode, "sample_every": otis.telemetry.sample_every}
+        arrays.update({"telemetry_" + name: column for name, column in otis.telemetry.columns().items()})
+    arrays["header"] = np.array(json.dumps(header))
+    (np.savez_compressed if compressed else np.savez)(path, **arrays)
+
+def load_snapshot(path, request_table = False, verbose = False, log_sink = None, telemetry = None, dispatcher = None, live_stats = None):
+    """
+    Restore a simulation saved with save_snapshot. Returns (otis, requests) where requests is a RequestTable if request_table
+    else a list of Passengers. dispatcher overrides the saved one, e.g. to fork what-if experiments from one state.
+    A saved telemetry or live stats are restored unless other ones are given.
+    """
+    with np.load(path) as saved:
+        header = json.loads(str(saved["header"]))
+        if header["version"] != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot version: {}".format(header["version"]))
+        arrays = {name: saved[name] for name in saved.files if name != "header"}
+
+    if telemetry is None and "telemetry" in header:
+        telemetry = Telemetry.from_columns({name[len("telemetry_"):]: column for name, column in arrays.items() if name.startswith("telemetry_")},
+            **header["telemetry"])
+    if live_stats is None and "live_stats" in header:
+        live_stats = LiveStats.from_dict(header["live_stats"])
+    if dispatcher is None:
+        if header["dispatcher"] is None:
+            raise ValueError("Snapshot was saved with a custom dispatcher, which has to be given to load_snapshot")
+        dispatcher = DISPATCHERS[header["dispatcher"]](**header.get("dispatcher_settings", {})) #Snapshots without settings used the defaults
+    config = BuildingConfig(**header["config"])
+    otis = Otis(verbose = verbose, elevator_num = header["elevator_num"], pick_up_mode = header["pick_up_mode"], log_sink = log_sink, telemetry = telemetry,
+        config = config, dispatcher = dispatcher, live_stats = live_stats)
+    otis.current_time = header["current_time"]
+    otis.all_idle = header["all_idle"]
+    otis.bank_heaps = [[] for _ in otis.bank_elevators]
+    for metric, elevator_id in arrays["elevator_heap"].tolist():
+        otis.bank_heaps[otis.elevator_bank[elevator_id]].append((metric, elevator_id)) #Saved in heap order, so each list is still a heap
+        otis.heap_metrics[elevator_id] = metric
+    otis.stale_heaps = set(header["stale_heaps"])
+
+    #Requests. Only requests referenced by a queue need a Passenger when they are kept in a RequestTable
+    columns = {name: arrays["request_" + name] for name, _ in RequestTable.COLUMNS}
+    size = header["requests"]
+    if request_table:
+        requests = RequestTable(capacity = max(size, 1024))
+        for name, _ in RequestTable.COLUMNS:
+            getattr(requests, name)[:size] = columns[name]
+        requests.size = size
+        referenced = set()
+        for queue in ("pick_up", "current_passengers", "priority"):
+            referenced.update(arrays[queue][:, 2].tolist())
+        passengers = {i: _passenger(columns, i, table = requests) for i in sorted(referenced)}
+    else:
+        requests = [_passenger(columns, i) for i in range(size)]
+        passengers = dict(enumerate(requests))
+
+    #Elevators
+    elevator_fields = {name: arrays["elevator_" + name].tolist() for name in ELEVATOR_FIELDS}
+    states = arrays["elevator_state"].tolist()
+    for elevator in otis.elevators:
+        for name in ELEVATOR_FIELDS:
+            setattr(elevator, name, elevator_fields[name][elevator.id])
+        elevator.current_state = STATES[states[elevator.id]]
+        elevator.log_template = header["log_templates"][elevator.id]
+    for elevator_id, floor, ref in arrays["pick_up"].tolist():
+        elevator = otis.elevators[elevator_id]
+        elevator.pick_up[floor].append(passengers[ref])
+        if floor not in elevator.pick_up_floors:
+            elevator.pick_up_floors.add(floor)
+            elevator.stops.add(floor)
+    for elevator_id, floor, ref in arrays["current_passengers"].tolist():
+        elevator = otis.elevators[elevator_id]
+        passenger = passengers[ref]
+        elevator.current_passengers[floor].append(passenger)
+        elevator.dest_load[floor] += passenger.num
+        if floor not in elevator.dest_floors:
+            elevator.dest_floors.add(floor)
+            elevator.stops.add(floor)
+    for elevator_id, time, ref in arrays["priority"].tolist():
+        otis.elevators[elevator_id].priority[passengers[ref]] = time
+    otis.active = {elevator.id for elevator in otis.elevators if elevator.current_state != "idle" or elevator.stops}
+    return otis, requests
+
+def _pending_passengers(otis):
+    #Requests waiting for or travelling in an elevator, each once
+    passengers = {}
+    for elevator in otis.elevators:
+        for queue in list(elevator.pick_up.values()) + list(elevator.current_passengers.values()):
+            for passenger in queue:
+                passengers[id(passenger)] = passenger
+    return list(passengers.values())
+
+def _passenger(columns, i, table = None):
+    #Passenger of row i of the request columns, with its timings filled in
+    depart, to, start_time, num, elevator, pick_up, complete = (int(columns[name][i]) for name, _ in RequestTable.COLUMNS)
+    passenger = Passenger(depart, to, start_time, num, id = i if table is not None else None, table = table)
+    if elevator >= 0:
+        passenger.elevator = elevator
+    if pick_up >= 0:
+        passenger.pick_up = pick_up
+    if complete >= 0:
+        passenger.complete = complete
+        passenger.wait_time = pick_up - start_time
+        passenger.travel_time = complete - pick_up
+    return passenger
+
+def _value(value):
+    return -1 if value is None else value
+
+def _queue_rows(rows):
+    return np.array(list(rows), dtype = np.int64).reshape(-1, 3)
+
+def _dispatcher_name(dispatcher):
+    #Name of a built-in dispatcher, None for custom ones (they have to be given again to load_snapshot, which raises otherwise)
+    for name, cls in DISPATCHERS.items():
+        if type(dispatcher) is cls:
+            return name
+    return None
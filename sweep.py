@@ -0,0 +1,123 @@
+from runner import Simulator
+from logger import NullSink
+from telemetry import Telemetry
+from config import BuildingConfig, OPENTIME, LOBBYTIME
+from livestats import LiveStats
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import pandas as pd
+import numpy as np
+import argparse, os
+from scipy.stats import t as student_t
+
+#Parameters that can be swept and their defaults
+GRID_DEFAULTS = {"seed": [1], "pick_up_mode": ["requests"], "elevator_num": [3], "lobby_prob": [0.2], "open_time": [OPENTIME], "lobby_time": [LOBBYTIME], "dispatcher": ["heap"]}
+
+def expand_grid(grid):
+    #Every combination of the parameters in grid (a dict of parameter -> list of values). Missing parameters use their default
+    grid = {name: list(grid.get(name, default)) for name, default in GRID_DEFAULTS.items()}
+    names = list(grid)
+    return [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+
+def run_one(params, request_length = 30, traffic_profile = None, num_floors = 100, arrival_rate = None, live_stats = False):
+    #Run a single simulation of the sweep and return its parameters with its summary stats
+    #With live_stats, the LiveStats of the run are returned as well (column "Live Stats") to be pooled over seeds, see pool
+    config = BuildingConfig(num_floors = num_floors, open_time = params["open_time"], lobby_time = params["lobby_time"])
+    simulator = Simulator(request_length = request_length, pick_up_mode = params["pick_up_mode"], random_seed = params["seed"], lobby_prob = params["lobby_prob"],
+        log_sink = NullSink(), telemetry = Telemetry(mode = "changes"), request_table = True,
+        traffic_profile = traffic_profile, arrival_rate = arrival_rate, elevator_num = params["elevator_num"], config = config, dispatcher = params["dispatcher"],
+        live_stats = LiveStats() if live_stats else None)
+    simulator.run("simulate")
+    simulator.fetch_summary_stats()
+    result = dict(params)
+    result.update(simulator.summary_df.iloc[0].to_dict())
+    result["Simulated Time"] = simulator.test_otis.current_time
+    if live_stats:
+        result["Live Stats"] = simulator.live_stats
+    return result
+
+def _run_one(args):
+    #Unpack arguments for the process pool
+    params, kwargs = args
+    return run_one(params, **kwargs)
+
+def sweep(grid, processes = None, chunksize = None, **kwargs):
+    """
+    Run every combination of grid (see expand_grid) over a process pool and return one row per simulation.
+    kwargs are passed to run_one (request_length, traffic_profile, num_floors, arrival_rate, live_stats).
+    processes defaults to the number of cores. Results are in the same order as expand_grid.
+    """
+    runs = expand_grid(grid)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        return pd.DataFrame([run_one(params, **kwargs) for params in runs])
+    if chunksize is None:
+        chunksize = max(1, len(runs)//(processes*4)) #Few large chunks keep the pool overhead low for thousands of short runs
+    with ProcessPoolExecutor(max_workers = processes) as pool:
+        results = list(pool.map(_run_one, [(params, kwargs) for params in runs], chunksize = chunksize))
+    return pd.DataFrame(results)
+
+def aggregate(results, metrics = None, confidence = 0.95):
+    #Mean, standard deviation and confidence interval of each metric over seeds, for every other combination of parameters
+    by = [name for name in GRID_DEFAULTS if name != "seed"]
+    if metrics is None:
+        metrics = [column for column in results.columns if column not in GRID_DEFAULTS and column != "Live Stats"]
+    grouped = results.groupby(by)[metrics]
+    mean, sd, count = grouped.mean(), grouped.std(ddof = 1), grouped.count()
+    half_width = student_t.ppf((1 + confidence)/2, np.maximum(count - 1, 1))*sd/np.sqrt(count)
+    summary = pd.concat({"mean": mean, "sd": sd, "ci_low": mean - half_width, "ci_high": mean + half_width, "runs": count}, axis = 1)
+    return summary.swaplevel(axis = 1).sort_index(axis = 1, level = 0, sort_remaining = False)
+
+def pool(results):
+    #Summary stats of all passengers over seeds, for every other combination of parameters, by merging the live stats of the runs.
+    #Unlike aggregate, percentiles are those of the pooled passengers rather than averages of per-seed percentiles
+    by = [name for name in GRID_DEFAULTS if name != "seed"]
+    rows, keys = [], []
+    for key, group in results.groupby(by)["Live Stats"]:
+        merged = LiveStats(window = group.iloc[0].window, precision = group.iloc[0].precision)
+        for live_stats in group:
+            merged.merge(live_stats)
+        rows.append({name: value[0] for name, value in merged.summary().items()})
+        keys.append(key)
+    return pd.DataFrame(rows, index = pd.MultiIndex.from_tuples(keys, names = by))
+
+def parse_values(text, cast):
+    #"1,2,5" -> [1, 2, 5]. Integer ranges can be given as "0-99"
+    values = []
+    for part in text.split(","):
+        if cast is int and "-" in part.strip()[1:]:
+            start, end = part.split("-")
+            values.extend(range(int(start), int(end) + 1))
+        else:
+            values.append(cast(part))
+    return values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", dest = "seeds", default = "0-9", help = "Random seeds, e.g. 0-99 or 1,2,3")
+    parser.add_argument("--pick_up_mode", dest = "pick_up_mode", default = "requests,num_passengers", help = "Pick-up metrics, e.g. requests,num_passengers")
+    parser.add_argument("--elevator_num", dest = "elevator_num", default = "3", help = "Numbers of elevators, e.g. 2,3,4")
+    parser.add_argument("--lobby_prob", dest = "lobby_prob", default = "0.2", help = "Lobby probabilities, e.g. 0.2,0.5")
+    parser.add_argument("--open_time", dest = "open_time", default = str(OPENTIME), help = "Door open times, e.g. 3,5")
+    parser.add_argument("--lobby_time", dest = "lobby_time", default = str(LOBBYTIME), help = "Lobby door open times, e.g. 20,30")
+    parser.add_argument("--dispatcher", dest = "dispatcher", default = "heap", help = "Dispatchers, e.g. heap,eta,destination")
+    parser.add_argument("--length", dest = "length", default = 30, help = "Length of Simulation data")
+    parser.add_argument("--traffic", dest = "traffic", default = None, help = "Traffic profile of the vectorized generator")
+    parser.add_argument("--floors", dest = "floors", default = 100, help = "Number of floors of simulated requests")
+    parser.add_argument("--rate", dest = "rate", default = None, help = "Poisson arrival rate (requests per second)")
+    parser.add_argument("--processes", dest = "processes", default = None, help = "Number of worker processes. Defaults to the number of cores")
+    parser.add_argument("--output", dest = "output", default = None, help = "CSV file to save every run to")
+    parser.add_argument("--pooled", dest = "pooled", default = False, action = "store_true", help = "Also print stats of all passengers pooled over seeds")
+    args = parser.parse_args()
+
+    grid = {"seed": parse_values(args.seeds, int), "pick_up_mode": parse_values(args.pick_up_mode, str), "elevator_num": parse_values(args.elevator_num, int),
+        "lobby_prob": parse_values(args.lobby_prob, float), "open_time": parse_values(args.open_time, int), "lobby_time": parse_values(args.lobby_time, int), "dispatcher": parse_values(args.dispatcher, str)}
+    results = sweep(grid, processes = int(args.processes) if args.processes else None, request_length = int(args.length), traffic_profile = args.traffic,
+        num_floors = int(args.floors), arrival_rate = float(args.rate) if args.rate else None, live_stats = args.pooled)
+    if args.output:
+        results.drop(columns = ["Live Stats"], errors = "ignore").to_csv(args.output, index = False)
+    pd.options.display.max_columns = None
+    pd.options.display.width = None
+    print(aggregate(results, metrics = ["Average Wait Time", "P90 Wait Time", "Average Total Time", "P90 Total Time"]).round(decimals = 2))
+    if args.pooled:
+        print(pool(results)[["Average Wait Time", "P90 Wait Time", "P99 Wait Time", "Average Total Time", "P90 Total Time", "P99 Total Time", "Total Passengers"]].round(decimals = 2))
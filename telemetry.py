@@ -0,0 +1,153 @@
+from array import array
+from itertools import repeat
+import numpy as np
+
+STATES = ["idle", "moving", "transferring"] #Elevator states. Stored as their index in this list
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+
+#Column name, array typecode and matching numpy dtype
+COLUMNS = [("elevator", "i", np.intc), ("time", "q", np.int64), ("floor", "i", np.intc), ("num_passengers", "i", np.intc), ("state", "b", np.int8), ("direction", "b", np.int8)]
+
+class Telemetry:
+    """
+    Columnar store of elevator states, shared by all elevators handled by an Otis instance.
+    Each column is a typed array.array so a row costs a few bytes instead of a handful of boxed Python ints.
+    Exports move the rows recorded since the last export into numpy buffers and return read-only views of them, so rows are
+    only copied once. Buffers only grow by reallocating and rows are never changed, so exported arrays stay valid while recording goes on.
+    There are 3 retention modes:
+    1) full: Every elevator state at every tick (default)
+    2) sampled: Only states at ticks where time % sample_every == 0
+    3) changes: Only rows where the state, direction or number of passengers of an elevator changed.
+       Floors in between can be recovered from the direction since elevators move 1 floor every floor_time ticks.
+    """
+    def __init__(self, mode = "full", sample_every = 1):
+        if mode not in ("full", "sampled", "changes"):
+            raise ValueError("Unknown telemetry mode: {}".format(mode))
+        self.mode = mode
+        self.sample_every = max(1, int(sample_every))
+        self.data = {name: array(typecode) for name, typecode, _ in COLUMNS} #Rows recorded since the last export
+        self.sealed = {name: np.empty(0, dtype = dtype) for name, _, dtype in COLUMNS} #Exported rows, in buffers with spare room
+        self.sealed_rows = 0
+        self.last_state = {} #Last (state, direction, num_passengers) recorded per elevator for changes mode
+
+    def __len__(self):
+        return self.sealed_rows + len(self.data["time"])
+
+    def record(self, elevator, time, floor, num_passengers, state, direction):
+        #Record the state of one elevator at one tick
+        state = STATE_CODES[state]
+        if self.mode == "sampled" and time % self.sample_every:
+            return
+        if self.mode == "changes":
+            key = (state, direction, num_passengers)
+            if self.last_state.get(elevator) == key:
+                return
+            self.last_state[elevator] = key
+        self.__append(elevator, time, floor, num_passengers, state, direction)
+
+    def record_span(self, elevator, time, ticks, floor, step, num_passengers, state, direction, floor_ticks = 1, phase = 0):
+        #Record a run of ticks where only the floor changes, by step every floor_ticks ticks (used by the event engine).
+        #Row i is at time + i and floor + step*((phase + i)//floor_ticks)
+        if ticks <= 0:
+            return
+        state = STATE_CODES[state]
+        if self.mode == "changes":
+            key = (state, direction, num_passengers)
+            if self.last_state.get(elevator) != key:
+                self.last_state[elevator] = key
+                self.__append(elevator, time, floor + step*(phase//floor_ticks), num_passengers, state, direction)
+            return
+        first = 0
+        every = 1
+        if self.mode == "sampled":
+            every = self.sample_every
+            first = -time % every #Offset of the first sampled tick in the span
+            if first >= ticks:
+                return
+        offsets = range(first, ticks, every)
+        count = len(offsets)
+        data = self.data
+        data["elevator"].extend(repeat(elevator, count))
+        data["time"].extend(range(time + first, time + ticks, every))
+        if not step:
+            data["floor"].extend(repeat(floor, count))
+        elif floor_ticks == 1:
+            start = floor + step*phase
+            data["floor"].extend(range(start + step*first, start + step*ticks, step*every))
+        else:
+            data["floor"].extend(floor + step*((phase + i)//floor_ticks) for i in offsets)
+        data["num_passengers"].extend(repeat(num_passengers, count))
+        data["state"].extend(repeat(state, count))
+        data["direction"].extend(repeat(direction, count))
+
+    def __append(self, elevator, time, floor, num_passengers, state, direction):
+        data = self.data
+        data["elevator"].append(elevator)
+        data["time"].append(time)
+        data["floor"].append(floor)
+        data["num_passengers"].append(num_passengers)
+        data["state"].append(state)
+        data["direction"].append(direction)
+
+    def __seal(self):
+        #Move the rows recorded since the last export to the numpy buffers, doubling them when full
+        start = self.sealed_rows
+        rows = start + len(self.data["time"])
+        if rows == start:
+            return
+        for name, _, dtype in COLUMNS:
+            buffer = self.sealed[name]
+            if rows > len(buffer):
+                grown = np.empty(max(rows, 2*len(buffer)), dtype = dtype)
+                grown[:start] = buffer[:start]
+                self.sealed[name] = buffer = grown
+            buffer[start:rows] = np.frombuffer(self.data[name], dtype = dtype)
+            del self.data[name][:]
+        self.sealed_rows = rows
+
+    def columns(self, elevator = None):
+        #Read-only numpy arrays of all columns. Rows are only copied once across exports, or every time if a single elevator is selected
+        self.__seal()
+        views = {}
+        for name, column in self.sealed.items():
+            view = column[:self.sealed_rows]
+            view.flags.writeable = False
+            views[name] = view
+        if elevator is not None:
+            mask = views["elevator"] == elevator
+            views = {name: column[mask] for name, column in views.items()}
+        return views
+
+    def to_frame(self, elevator = None):
+        #Export as a pandas DataFrame. States are exported as a categorical built on top of the state codes
+        import pandas as pd
+        columns = self.columns(elevator)
+        columns["state"] = pd.Categorical.from_codes(columns["state"], categories = STATES)
+        return pd.DataFrame(columns, copy = False)
+
+    def to_npz(self, path):
+        np.savez(path, mode = self.mode, sample_every = self.sample_every, **self.columns())
+
+    def to_parquet(self, path):
+        #Requires pyarrow or fastparquet to be installed
+        self.to_frame().to_parquet(path)
+
+    @classmethod
+    def from_npz(cls, path):
+        #Load a trace saved with to_npz, e.g. to replay it
+        with np.load(path) as saved:
+            return cls.from_columns(saved, mode = str(saved["mode"]), sample_every = int(saved["sample_every"]))
+
+    @classmethod
+    def from_columns(cls, columns, mode = "full", sample_every = 1):
+        #Telemetry holding a copy of columns (name -> array), which can keep on recording
+        telemetry = cls(mode = mode, sample_every = sample_every)
+        for name, _, dtype in COLUMNS:
+            telemetry.sealed[name] = np.array(columns[name], dtype = dtype)
+        telemetry.sealed_rows = len(telemetry.sealed["time"])
+        if telemetry.mode == "changes":
+            #Last recorded state of each elevator, so unchanged states are not recorded again
+            sealed = telemetry.sealed
+            for elevator, state, direction, num_passengers in zip(sealed["elevator"].tolist(), sealed["state"].tolist(), sealed["direction"].tolist(), sealed["num_passengers"].tolist()):
+                telemetry.last_state[elevator] = (state, direction, num_passengers)
+        return telemetry
@@ -1,5 +1,7 @@
 from runner import *
-import argparse
+from logger import *
+from profiling import Profiler
+import argparse, cProfile
 
 #Each request is given by a tuple: (pick_up_floor, drop_off_floor, time of request, number of passengers)
 test_case_1 = [(1,100,5,2)] #Test one simple case
@@ -13,25 +15,45 @@ test_case_8 = [(2,10, 10, 5) for i in range(12)] #Test case with all queries com
 test_case_9 = [(2,10, 1, 5) for i in range(12)] +  [(8,11, 3, 5) for i in range(12)]+  [(9,12, 5, 5) for i in range(3)] 
 test_case_10 = [(2,10, 1, 5) for i in range(12)] +  [(8,11, 3, 5) for i in range(6)]+  [(12,9, 7, 5) for i in range(3)] 
 
-def test_custom(test_case = "1", pick_up_mode = "requests",verbose = True, lobby_prob = 0.2):
+def test_custom(test_case = "1", pick_up_mode = "requests",verbose = True, lobby_prob = 0.2, engine = "event", log_sink = None, dispatcher = None, profiler = None):
     #Test using custom data
     print("Testing test case {}... \n".format(test_case))
-    simulator = Simulator(verbose = True, test_data = eval("test_case_{}".format(test_case)), pick_up_mode = pick_up_mode, lobby_prob = lobby_prob)
+    simulator = Simulator(verbose = True, test_data = eval("test_case_{}".format(test_case)), pick_up_mode = pick_up_mode, lobby_prob = lobby_prob, engine = engine, log_sink = log_sink, dispatcher = dispatcher, profiler = profiler)
     simulator.run("test")
     simulator.fetch_summary_stats()
     print("\n")
     print(simulator.summary_df.round(decimals = 2))
     print("\n")
+    if profiler is not None:
+        print(simulator.profile_df.round(decimals = 4))
+        print("\n")
 
-def test_random(request_length = 30, pick_up_mode = "requests", verbose = False, random_seed = 1, lobby_prob = 0.2):
+def test_random(request_length = 30, pick_up_mode = "requests", verbose = False, random_seed = 1, lobby_prob = 0.2, engine = "event", log_sink = None, traffic_profile = None, num_floors = 100, arrival_rate = None, dispatcher = None, profiler = None):
     #Tests using simulated data
     print("Testing simulation {}... \n".format(random_seed))
-    simulator = Simulator(request_length = request_length, pick_up_mode = pick_up_mode, verbose = verbose, random_seed = random_seed, lobby_prob = lobby_prob)
+    simulator = Simulator(request_length = request_length, pick_up_mode = pick_up_mode, verbose = verbose, random_seed = random_seed, lobby_prob = lobby_prob, engine = engine, log_sink = log_sink,
+        traffic_profile = traffic_profile, num_floors = num_floors, arrival_rate = arrival_rate, dispatcher = dispatcher, profiler = profiler)
     simulator.run("simulate")
     simulator.fetch_summary_stats()
     print("\n")
     print(simulator.summary_df.round(decimals = 2))
     print("\n")
+    if profiler is not None:
+        print(simulator.profile_df.round(decimals = 4))
+        print("\n")
+
+def run_stream(path, pick_up_mode = "requests", verbose = False, engine = "event", log_sink = None, dispatcher = None, profiler = None):
+    #Tests using requests streamed lazily from a .jsonl/.csv file
+    print("Testing requests from {}... \n".format(path))
+    simulator = Simulator(pick_up_mode = pick_up_mode, verbose = verbose, engine = engine, log_sink = log_sink, request_table = True, dispatcher = dispatcher, profiler = profiler)
+    simulator.run("stream", requests = path)
+    simulator.fetch_summary_stats()
+    print("\n")
+    print(simulator.summary_df.round(decimals = 2))
+    print("\n")
+    if profiler is not None:
+        print(simulator.profile_df.round(decimals = 4))
+        print("\n")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -41,7 +63,16 @@ if __name__ == "__main__":
     parser.add_argument("--verbose", dest = "verbose", default = False)
     parser.add_argument("--seed", dest = "seed", default = 1, help = "Which random seed to use")
     parser.add_argument("--lobby_prob", dest = "prob", default = 0.2, help = "Probability of lobby being chosen. Has to be less than 1")
+    parser.add_argument("--traffic", dest = "traffic", default = None, help = "Traffic profile of the vectorized generator. Takes in 5 values: uniform, poisson, up_peak, lunch, down_peak")
+    parser.add_argument("--floors", dest = "floors", default = 100, help = "Number of floors of simulated requests")
+    parser.add_argument("--rate", dest = "rate", default = None, help = "Poisson arrival rate (requests per second) of simulated requests")
     parser.add_argument("--test_case", dest = "test_case", default = "1", help = "Which custom data test case to use")
+    parser.add_argument("--input", dest = "input", default = None, help = "Stream requests from a .jsonl/.csv file instead of simulating or using custom data")
+    parser.add_argument("--dispatcher", dest = "dispatcher", default = "heap", help = "Allocation strategy. Takes in 3 values: heap, eta, destination")
+    parser.add_argument("--engine", dest = "engine", default = "event", help = "Simulation engine. Takes in 2 values: event, tick")
+    parser.add_argument("--log", dest = "log", default = "print", help = "Where to send logs. Takes in 4 values: print, null, file, jsonl")
+    parser.add_argument("--log_path", dest = "log_path", default = "simulation.log", help = "Log file to use if log is set to file or jsonl")
+    parser.add_argument("--profile", dest = "profile", default = None, help = "cProfile/pstats file to dump. Also prints the time spent in each phase of the simulation")
 
     args = parser.parse_args()
 
@@ -54,10 +85,35 @@ if __name__ == "__main__":
         verbose = True
     else:
         verbose = False
+
+    level = DEBUG if verbose else INFO
+    if args.log == "null":
+        log_sink = NullSink()
+    elif args.log == "file":
+        log_sink = FileSink(args.log_path, level = level)
+    elif args.log == "jsonl":
+        log_sink = JSONLinesSink(args.log_path, level = level)
+    else:
+        log_sink = PrintSink(level = level)
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler()
+        cprofile = cProfile.Profile()
+        cprofile.enable()
     
-    if sim:
+    if args.input:
+        #Test using requests streamed from a file
+        run_stream(args.input, pick_up_mode = args.pick_up_mode, verbose = verbose, engine = args.engine, log_sink = log_sink, dispatcher = args.dispatcher, profiler = profiler)
+    elif sim:
         #Test using simulated data
-        test_random(request_length = int(args.length), pick_up_mode = args.pick_up_mode, verbose = verbose, random_seed = int(args.seed), lobby_prob = float(args.prob))
+        test_random(request_length = int(args.length), pick_up_mode = args.pick_up_mode, verbose = verbose, random_seed = int(args.seed), lobby_prob = float(args.prob), engine = args.engine, log_sink = log_sink, dispatcher = args.dispatcher, profiler = profiler,
+            traffic_profile = args.traffic, num_floors = int(args.floors), arrival_rate = float(args.rate) if args.rate else None)
     else:
         #Test using custom data
-        test_custom(test_case = args.test_case, pick_up_mode = args.pick_up_mode, verbose = verbose, lobby_prob = float(args.prob))
+        test_custom(test_case = args.test_case, pick_up_mode = args.pick_up_mode, verbose = verbose, lobby_prob = float(args.prob), engine = args.engine, log_sink = log_sink, dispatcher = args.dispatcher, profiler = profiler)
+    if args.profile:
+        cprofile.disable()
+        cprofile.dump_stats(args.profile)
+        print("Profile saved to {}. Open it with pstats or snakeviz \n".format(args.profile))
+    log_sink.close()
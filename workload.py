@@ -0,0 +1,99 @@
+import math
+import numpy as np
+from scipy.stats import truncnorm
+
+#Traffic profiles. Each request is either incoming (lobby -> upper floor), outgoing (upper floor -> lobby) or interfloor,
+#drawn with these probabilities. "uniform" and "poisson" instead choose the lobby with lobby_prob for both pick-up and drop-off
+PROFILES = {
+    "up_peak": {"incoming": 0.85, "outgoing": 0.05}, #Morning: most passengers arrive at the lobby and go up
+    "lunch": {"incoming": 0.4, "outgoing": 0.4}, #Lunch: two-way traffic to and from the lobby
+    "down_peak": {"incoming": 0.05, "outgoing": 0.85}, #Evening: most passengers leave the building
+    "uniform": None,
+    "poisson": None,
+}
+POISSON_RATE = 0.5 #Default arrival rate (requests per second) of the poisson profile. Same mean as the uniform 0-4s gaps
+
+def generate_requests(request_length, profile = "uniform", num_floors = 100, lobby_prob = 0.2, arrival_rate = None, random_seed = 1, chunk_size = 1 << 16, config = None):
+    """
+    Vectorized request generator. Yields numpy arrays of shape (n, 4) with columns (pick-up, drop-off, time, num_passengers),
+    at most chunk_size rows at a time and ordered by time, so millions of requests never have to be held at once.
+    Floors are 1 (lobby) to num_floors. Arrivals are a poisson process if arrival_rate (requests per second) is given,
+    otherwise requests are 0-4s apart like Simulator.simulate_data.
+    Output is reproducible for a given random_seed and chunk_size.
+    Given a BuildingConfig with banks, drop-off floors are redrawn until a bank serves both floors of the request (see BuildingConfig.serves).
+    """
+    if profile not in PROFILES:
+        raise ValueError("Unknown traffic profile: {}. Options: {}".format(profile, ", ".join(PROFILES)))
+    if num_floors < (3 if PROFILES[profile] else 2):
+        raise ValueError("Building is too small for the {} profile: {} floors".format(profile, num_floors))
+    if profile == "poisson" and arrival_rate is None:
+        arrival_rate = POISSON_RATE
+    masks = None #Floor -> bitmask of the banks serving it
+    if config is not None and config.banks:
+        masks = np.zeros(num_floors + 1, dtype = np.int64)
+        for floor, mask in config.floor_banks.items():
+            if floor <= num_floors:
+                masks[floor] = mask
+        if not masks[1:].all():
+            raise ValueError("Every floor needs a bank to generate requests: {}".format(np.flatnonzero(masks[1:] == 0) + 1))
+    rng = np.random.default_rng(random_seed)
+    num_func = truncnorm(-math.inf, math.log(5)) #Given lognormal with bounds (0,5] --> equivalent to a truncated normal (-inf, ln5]
+    last_time = 0.0 if arrival_rate else 1 #Time of the previous request, carried over between chunks
+    remaining = request_length
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        remaining -= size
+
+        #Pick-up and drop-off floors
+        if PROFILES[profile] is None:
+            pick_up = _lobby_or_floor(rng, size, lobby_prob, num_floors)
+            drop_off = _lobby_or_floor(rng, size, lobby_prob, num_floors)
+            same = _unserved(pick_up, drop_off, masks)
+            while same.any():
+                #Have to make sure dropoff and pickup are different (and served by the same bank)
+                drop_off[same] = _lobby_or_floor(rng, int(same.sum()), lobby_prob, num_floors)
+                same = _unserved(pick_up, drop_off, masks)
+        else:
+            pick_up, drop_off = _profile_floors(rng, size, PROFILES[profile], num_floors, masks)
+
+        #Request times
+        if arrival_rate:
+            arrivals = last_time + np.cumsum(rng.exponential(1/arrival_rate, size))
+            last_time = arrivals[-1]
+            times = np.ceil(arrivals).astype(np.int64)
+        else:
+            times = last_time + np.cumsum(rng.integers(0, 5, size))
+            last_time = times[-1]
+
+        num_passengers = np.ceil(np.exp(num_func.rvs(size = size, random_state = rng))).astype(np.int64)
+        yield np.column_stack([pick_up, drop_off, times, num_passengers])
+
+def iter_generated(request_length, **kwargs):
+    #Generated requests as (pick-up, drop-off, time, num_passengers) tuples of ints, e.g. for Simulator.run("stream")
+    for chunk in generate_requests(request_length, **kwargs):
+        yield from map(tuple, chunk.tolist())
+
+def _lobby_or_floor(rng, size, lobby_prob, num_floors):
+    #lobby_prob chance of lobby being chosen, otherwise any other floor
+    return np.where(rng.random(size) < lobby_prob, 1, rng.integers(2, num_floors + 1, size))
+
+def _unserved(pick_up, drop_off, masks):
+    #Requests with the same pick-up and drop-off floor, or whose floors no bank serves together
+    same = pick_up == drop_off
+    if masks is not None:
+        same |= (masks[pick_up] & masks[drop_off]) == 0
+    return same
+
+def _profile_floors(rng, size, profile, num_floors, masks = None):
+    kind = rng.random(size)
+    incoming = kind < profile["incoming"]
+    outgoing = (kind >= profile["incoming"]) & (kind < profile["incoming"] + profile["outgoing"])
+    pick_up = rng.integers(2, num_floors + 1, size)
+    drop_off = rng.integers(2, num_floors + 1, size)
+    pick_up[incoming] = 1
+    drop_off[outgoing] = 1
+    same = _unserved(pick_up, drop_off, masks) #Only possible for interfloor requests
+    while same.any():
+        drop_off[same] = rng.integers(2, num_floors + 1, int(same.sum()))
+        same = _unserved(pick_up, drop_off, masks)
+    return pick_up, drop_off